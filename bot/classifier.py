@@ -0,0 +1,175 @@
+"""
+Learned router: multinomial naive Bayes over hashed word unigrams and bigrams, trained on posted messages.
+Labels are destination channel ids. Inference is a few dictionary lookups per word, far below a millisecond,
+so the LLM is only asked when the model isn't confident. New posts are learned incrementally, one document per
+post with the text routing classifies, like tools/train_router.py does, and advance trained_until so the CLI
+doesn't learn them again. When the CLI rewrites the model file the processor reloads it.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import math
+import zlib
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import regex as re
+
+from bot.config import ROUTER_MODEL_PATH, ROUTER_MIN_DOCS
+
+PATTERN_MARKUP = re.compile(r"<[^>]+>|https?://\S+|t\.me/\S+|[@#]\w+")
+PATTERN_WORD = re.compile(r"\p{L}{2,}")
+# Footer appended by format_text, not part of the content
+FOOTER_MARKER = "\n\nQuelle:"
+
+BUCKETS = 1 << 18
+ALPHA = 0.1
+LOG_ALPHA = math.log(ALPHA)
+# Only the beginning of a post is needed to tell where it belongs
+TEXT_LIMIT = 1000
+
+
+def strip_footer(text: str) -> str:
+    return text.split(FOOTER_MARKER, 1)[0]
+
+
+def _hash(token: str) -> int:
+    # crc32 instead of hash(), which is salted per process and would break saved models
+    return zlib.crc32(token.encode("utf-8")) % BUCKETS
+
+
+def features(text: str) -> Counter:
+    """Hashed lowercased words and word pairs."""
+    words = PATTERN_WORD.findall(PATTERN_MARKUP.sub(" ", text[:TEXT_LIMIT]).lower())
+    result = Counter(_hash(w) for w in words)
+    result.update(_hash(f"{a} {b}") for a, b in zip(words, words[1:]))
+    return result
+
+
+class HashingNaiveBayes:
+    """Sparse multinomial naive Bayes with additive smoothing, trainable one document at a time."""
+
+    def __init__(self) -> None:
+        self.counts: Dict[int, Dict[int, float]] = defaultdict(dict)
+        # log(count + ALPHA) - log(ALPHA) per seen feature, kept in step with counts for fast scoring
+        self._weights: Dict[int, Dict[int, float]] = defaultdict(dict)
+        self.totals: Dict[int, float] = defaultdict(float)
+        self.docs: Dict[int, int] = defaultdict(int)
+        self.trained_until: Optional[str] = None  # created_at of the newest post learned from the table
+        self.dirty = False
+        self.mtime: Optional[int] = None  # Of the model file when it was last loaded or saved
+
+    def __len__(self) -> int:
+        return sum(self.docs.values())
+
+    def learn(self, text: str, label: int, created_at: Optional[str] = None) -> None:
+        """Learn one post, created_at advances trained_until for posts stored in the table."""
+        counts = self.counts[label]
+        weights = self._weights[label]
+        for f, n in features(text).items():
+            counts[f] = counts.get(f, 0) + n
+            weights[f] = math.log(counts[f] + ALPHA) - LOG_ALPHA
+            self.totals[label] += n
+        self.docs[label] += 1
+        if created_at is not None and (self.trained_until is None or created_at > self.trained_until):
+            self.trained_until = created_at
+        self.dirty = True
+
+    def predict(self, text: str) -> Optional[Tuple[int, float]]:
+        """(label, confidence), None if the model has too little data or the text no known words."""
+        if len(self) < ROUTER_MIN_DOCS or len(self.docs) < 2:
+            return None
+
+        feats = features(text)
+        if not feats:
+            return None
+
+        # Every feature contributes log(ALPHA) as if unseen, plus the precomputed weight where the label has seen it
+        total_docs = len(self)
+        length = sum(feats.values())
+        items = list(feats.items())
+        scores = {}
+        for label, weights in self._weights.items():
+            score = math.log(self.docs[label] / total_docs) + length * LOG_ALPHA
+            score -= length * math.log(self.totals[label] + ALPHA * BUCKETS)
+            get = weights.get
+            score += sum(n * get(f, 0.0) for f, n in items)
+            scores[label] = score
+
+        # Posterior damped by the text length, raw naive Bayes is overconfident on long posts
+        scale = length ** 0.5
+        best = max(scores.values())
+        weights = {label: math.exp((score - best) / scale) for label, score in scores.items()}
+        label = max(weights, key=weights.get)
+        return label, weights[label] / sum(weights.values())
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """Copy of the model state, posts learned while it is written don't change it."""
+        self.dirty = False
+        return {
+            "trained_until": self.trained_until,
+            "docs": dict(self.docs),
+            "totals": dict(self.totals),
+            "counts": {label: dict(counts) for label, counts in self.counts.items()},
+        }
+
+    @staticmethod
+    def _write(path: Path, data: Dict[str, Any]) -> int:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        tmp.replace(path)
+        return path.stat().st_mtime_ns
+
+    def save(self, path: Path = Path(ROUTER_MODEL_PATH)) -> None:
+        self.mtime = self._write(path, self._snapshot())
+
+    async def save_async(self, path: Path = Path(ROUTER_MODEL_PATH)) -> None:
+        """Save without blocking the event loop, the dicts are copied first and written in an executor."""
+        data = self._snapshot()
+        self.mtime = await asyncio.get_running_loop().run_in_executor(None, self._write, path, data)
+
+    @classmethod
+    def load(cls, path: Path = Path(ROUTER_MODEL_PATH)) -> "HashingNaiveBayes":
+        model = cls()
+        if not path.exists():
+            logging.info(f"No router model at {path}, starting empty")
+            return model
+
+        model.mtime = path.stat().st_mtime_ns
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        # JSON keys are strings
+        model.trained_until = data["trained_until"]
+        model.docs.update({int(k): v for k, v in data["docs"].items()})
+        model.totals.update({int(k): v for k, v in data["totals"].items()})
+        for label, counts in data["counts"].items():
+            model.counts[int(label)] = {int(f): n for f, n in counts.items()}
+            model._weights[int(label)] = {f: math.log(n + ALPHA) - LOG_ALPHA for f, n in model.counts[int(label)].items()}
+        logging.info(f"Loaded router model with {len(model)} posts for {len(model.docs)} destinations")
+        return model
+
+
+_router: Optional[HashingNaiveBayes] = None
+
+
+def get_router() -> HashingNaiveBayes:
+    """Get or load the global learned router."""
+    global _router
+    if _router is None:
+        _router = HashingNaiveBayes.load()
+    return _router
+
+
+def reload_router(path: Path = Path(ROUTER_MODEL_PATH)) -> bool:
+    """Reload the global router if the model file was written by someone else, e.g. tools/train_router.py.
+    Posts learned since then and not yet saved are dropped, they are newer than the file's trained_until,
+    so the next incremental training learns them from the table."""
+    global _router
+    if _router is None or not path.exists() or path.stat().st_mtime_ns == _router.mtime:
+        return False
+    _router = HashingNaiveBayes.load(path)
+    return True
@@ -8,8 +8,8 @@ from pyrogram import Client, filters, compose
 from pyrogram.enums import ParseMode
 from pyrogram.types import Message
 
-from bot.config import CHANNEL_BACKUP, PASSWORD, CONTAINER
-from bot.db import get_accounts, get_source_ids_by_api_id, set_post, get_post
+from bot.config import CHANNEL_BACKUP, PASSWORD, CONTAINER, JOB_QUEUE, MEDIA_GROUP_QUIET, MEDIA_GROUP_MAX_WAIT
+from bot.db import get_accounts, get_source_ids_by_api_id, set_post, get_post, set_backup_post, notify_reply
 from bot.db_cache import get_cache
 from bot.model import Post
 
@@ -77,11 +77,6 @@ async def main():
             if not source or not source.is_active:
                 return
             
-            # Forward to backup
-            backup_id = await backup_message(client, message)
-            if not backup_id:
-                return
-
             # Handle reply logic
             reply_id = None
             if message.reply_to_message_id:
@@ -89,11 +84,23 @@ async def main():
                 reply_post = await get_post(message.chat.id, message.reply_to_message_id)
                 if reply_post:
                     reply_id = reply_post.backup_id
+
+            if reply_id and not JOB_QUEUE:
+                # Announced before the forward, so the processor knows it is a reply when the forward arrives
+                try:
+                    await notify_reply(message.chat.id, message.id, reply_id)
+                except Exception as e:
+                    logging.warning(f"Announcing reply {message.chat.id}/{message.id} failed: {e}")
+
+            # Forward to backup
+            backup_id = await backup_message(client, message)
+            if not backup_id:
+                return
             
             # Record the backup in the database
             # Note: We use destination=CHANNEL_BACKUP and message_id=backup_id
             # This allows the processor to find the backup_id for replies.
-            await set_post(Post(
+            post = Post(
                 destination=CHANNEL_BACKUP,
                 message_id=backup_id,
                 source_channel_id=message.chat.id,
@@ -101,7 +108,12 @@ async def main():
                 backup_id=backup_id,
                 reply_id=reply_id,
                 message_text=message.text or message.caption
-            ))
+            )
+            if JOB_QUEUE:
+                # In one transaction, a backup row without its job would never be processed
+                await set_backup_post(post, message.media_group_id, MEDIA_GROUP_QUIET, MEDIA_GROUP_MAX_WAIT)
+            else:
+                await set_post(post)
 
         apps.append(app)
         
@@ -24,9 +24,112 @@ DATABASE_URL_TEST: Final[str] = os.getenv("DATABASE_URL_TEST")
 PASSWORD = os.getenv("PASSWORD")
 OPENROUTER_API_KEY=os.getenv("OPENROUTER_API_KEY")
 
+# Translation: max in-flight requests per backend and threads for blocking SDK calls
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", 8))
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", 4))
+
+# DeepL micro-batching: collect window in seconds, max texts and max characters per request
+TRANSLATION_BATCH_WINDOW = float(os.getenv("TRANSLATION_BATCH_WINDOW", 0.05))
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", 50))
+TRANSLATION_BATCH_CHARS = int(os.getenv("TRANSLATION_BATCH_CHARS", 30000))
+
+# Translator scheduler: hedge DeepL with Google beyond this latency percentile (at least min delay seconds),
+# open the circuit after this many consecutive failures for reset seconds
+TRANSLATION_HEDGE_PERCENTILE = float(os.getenv("TRANSLATION_HEDGE_PERCENTILE", 95))
+TRANSLATION_HEDGE_MIN_DELAY = float(os.getenv("TRANSLATION_HEDGE_MIN_DELAY", 1.0))
+TRANSLATION_BREAKER_FAILURES = int(os.getenv("TRANSLATION_BREAKER_FAILURES", 5))
+TRANSLATION_BREAKER_RESET = float(os.getenv("TRANSLATION_BREAKER_RESET", 60))
+
+# Translation memo: in-memory entries, TTL in seconds and whether to back it with the translations table
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 2048))
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", 7 * 24 * 3600))
+TRANSLATION_CACHE_PERSIST = os.getenv("TRANSLATION_CACHE_PERSIST", "true").lower() == "true"
+
+# Route on the German translation instead of the debloated original, which serializes routing after translation
+ROUTE_ON_TRANSLATION = os.getenv("ROUTE_ON_TRANSLATION", "false").lower() == "true"
+
+# Processor pipeline: workers and queue size per stage, overridable as e.g. PIPELINE_TRANSLATE_WORKERS=8
+PIPELINE_STAGES = ("dedup", "debloat", "translate", "route", "format", "send", "persist")
+# Send workers mostly wait for their destination's outbound queue, enough of them keep one channel's FloodWait
+# from holding up the others
+PIPELINE_DEFAULT_WORKERS = {"dedup": 4, "debloat": 4, "translate": TRANSLATION_CONCURRENCY, "route": 16, "format": 4,
+                            "send": 16, "persist": 4}
+PIPELINE_WORKERS = {stage: int(os.getenv(f"PIPELINE_{stage.upper()}_WORKERS", PIPELINE_DEFAULT_WORKERS[stage]))
+                    for stage in PIPELINE_STAGES}
+PIPELINE_QUEUE_SIZE = {stage: int(os.getenv(f"PIPELINE_{stage.upper()}_QUEUE", 50)) for stage in PIPELINE_STAGES}
+
+# Media groups: complete after this many quiet seconds since the last part, at the latest after the max wait,
+# and at most this many groups assembled at once
+MEDIA_GROUP_QUIET = float(os.getenv("MEDIA_GROUP_QUIET", 0.5))
+MEDIA_GROUP_MAX_WAIT = float(os.getenv("MEDIA_GROUP_MAX_WAIT", 10))
+MEDIA_GROUP_MAX_PENDING = int(os.getenv("MEDIA_GROUP_MAX_PENDING", 100))
+
+# Outbound sends per destination channel: sustained posts per minute, burst size and FloodWait retries
+OUTBOUND_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_RATE_PER_MINUTE", 20))
+OUTBOUND_BURST = float(os.getenv("OUTBOUND_BURST", 3))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+
+# Durable job queue from collector to processors, off by default so the processor listens to backup updates until
+# the jobs table is migrated and both sides are deployed. Jobs claimed per poll, seconds a claimed job stays hidden
+# (extended while it is processed), attempts before it is given up, retry delay, poll interval when idle
+# and days finished jobs are kept
+JOB_QUEUE = os.getenv("JOB_QUEUE", "false").lower() == "true"
+JOB_BATCH = int(os.getenv("JOB_BATCH", 10))
+JOB_VISIBILITY_TIMEOUT = float(os.getenv("JOB_VISIBILITY_TIMEOUT", 600))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 5))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 30))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 0.5))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", 7))
+
+# Local gazetteer routing: minimum keyword score and share of the best region to skip the LLM
+GAZETTEER_MIN_SCORE = float(os.getenv("GAZETTEER_MIN_SCORE", 2))
+GAZETTEER_MIN_SHARE = float(os.getenv("GAZETTEER_MIN_SHARE", 0.8))
+
+# LLM routing: start the next model after this many seconds without an answer,
+# give up and use the source's default destination after the budget
+ROUTING_STAGGER = float(os.getenv("ROUTING_STAGGER", 2))
+ROUTING_BUDGET = float(os.getenv("ROUTING_BUDGET", 10))
+
+# Routing batches: collect window in seconds, max posts and max characters per request
+ROUTING_BATCH_WINDOW = float(os.getenv("ROUTING_BATCH_WINDOW", 0.3))
+ROUTING_BATCH_SIZE = int(os.getenv("ROUTING_BATCH_SIZE", 8))
+ROUTING_BATCH_CHARS = int(os.getenv("ROUTING_BATCH_CHARS", 12000))
+
+# Per-model limits for the free routing models: requests per minute and burst for the client-side token bucket,
+# bench time after a 429 without Retry-After, consecutive failures before benching and for how many seconds
+ROUTING_MODEL_RPM = float(os.getenv("ROUTING_MODEL_RPM", 20))
+ROUTING_MODEL_BURST = float(os.getenv("ROUTING_MODEL_BURST", 5))
+ROUTING_RATE_LIMIT_BENCH = float(os.getenv("ROUTING_RATE_LIMIT_BENCH", 60))
+ROUTING_BREAKER_FAILURES = int(os.getenv("ROUTING_BREAKER_FAILURES", 3))
+ROUTING_BREAKER_RESET = float(os.getenv("ROUTING_BREAKER_RESET", 600))
+
+# Routing memo: in-memory entries, TTL in seconds, persistence in the routes table
+# and the minimum confidence a stored decision needs to be reused
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", 4096))
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", 3 * 24 * 3600))
+ROUTE_CACHE_PERSIST = os.getenv("ROUTE_CACHE_PERSIST", "true").lower() == "true"
+ROUTE_CACHE_MIN_CONFIDENCE = float(os.getenv("ROUTE_CACHE_MIN_CONFIDENCE", 0.5))
+
+# Recent backup message -> destination post entries kept in memory to thread replies without a DB lookup
+THREAD_MAP_SIZE = int(os.getenv("THREAD_MAP_SIZE", 20000))
+
+# Days of spread posts loaded into the in-memory index that answers "already posted?" without a DB lookup
+POSTED_INDEX_DAYS = int(os.getenv("POSTED_INDEX_DAYS", 30))
+
+# Skip translation when a post is detected as German with at least this confidence
+LANGUAGE_SKIP_CONFIDENCE = float(os.getenv("LANGUAGE_SKIP_CONFIDENCE", 0.8))
+
+# Interval in seconds for logging runtime stats and evicting expired cache entries
+STATS_INTERVAL = int(os.getenv("STATS_INTERVAL", 300))
+
 TESTING = False
 LOG_FILENAME = rf"./logs/{datetime.now().strftime('%Y-%m-%d/%H-%M-%S')}.log"
 
 CONTAINER: Final[bool] = bool(os.getenv('CONTAINER', False), )
 
 RES_PATH: Final[str] = "./res"
+
+# Learned router: model file, minimum posts before it is used and confidence needed to skip the LLM
+ROUTER_MODEL_PATH = os.getenv("ROUTER_MODEL_PATH", f"{RES_PATH}/router.json.gz")
+ROUTER_MIN_DOCS = int(os.getenv("ROUTER_MIN_DOCS", 200))
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", 0.9))
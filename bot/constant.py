@@ -2,13 +2,24 @@ import regex as re
 
 PATTERN_HASHTAG = re.compile(r"(\s+#\S*)*$")
 PATTERN_HTMLTAG = re.compile(r"<[^a>]+>")
+# Tag cut off by a truncation
+PATTERN_PARTIAL_TAG = re.compile(r"<[^<>]*$")
 PATTERN_FITZPATRICK = re.compile(u"[\U0001F3FB-\U0001F3FF♂️♀️]", flags=re.UNICODE)
-PATTERN_PARAGRAPH = re.compile(r'(?<=\D{20,}[\.\!\?])\s+')
+# Sentence breaks: whitespace after .!? that is preceded by at least 20 non-digits (checked separately)
+PATTERN_SENTENCE_END = re.compile(r'[\.\!\?]\s+')
+PATTERN_DIGIT = re.compile(r'\d')
+SENTENCE_MIN_NON_DIGITS = 20
+PATTERN_INVITE = re.compile(r"t\.me/\+")
 # FLAG_EMOJI = re.compile(u"🏴|🏳️|[\U0001F1E6-\U0001F1FF]{2}|<\/?a[^>]*>", re.UNICODE)  # 🏴|🏳️|([🇦-🇿]{2})|( ##|\n{2,}
 emoji_space_pattern = re.compile(r"([‼\p{So}])([^\s‼\p{So}]+)", flags=re.UNICODE)
 emoji_pattern = re.compile(r"[‼\p{So}]|(?:<\/?a[^>]*>)", flags=re.UNICODE)
 
-PLACEHOLDER = '<body translate="no">'  # ║ #▓
+# Short indexed tag per protected emoji or link, DeepL keeps tags untouched with tag_handling="html"
+PLACEHOLDER = '<e{}/>'
+# Tolerates spacing changes and closing variants like "</e3>" that translators may emit
+PATTERN_PLACEHOLDER = re.compile(r"<\s*/?\s*e\s*(\d+)\s*/?\s*>")
+# Former verbose placeholder, kept to report billed characters saved per message
+LEGACY_PLACEHOLDER = '<body translate="no">'
 
 REPLACEMENTS = {
     "ЗСУ": "Збро́йні си́ли Украї́ни",
@@ -1,16 +1,17 @@
 import logging
 import sys
 from contextlib import asynccontextmanager
+from datetime import datetime
 from dataclasses import fields
 from functools import wraps
 from os import getenv
 from ssl import create_default_context, Purpose, CERT_NONE
 from typing import Dict, Union, List, Optional, Callable, Awaitable, Any
 
-from asyncpg import Pool, create_pool, Connection, Record
+from asyncpg import Pool, create_pool, connect, Connection, Record
 
 from bot.config import DATABASE_URL
-from bot.model import Account, Source, SourceDisplay, Post, Destination
+from bot.model import Account, Source, SourceDisplay, Post, Destination, RouteDecision, BackupJob
 
 
 def record_to_dataclass(record: Record, dataclass_type: Any) -> Any:
@@ -151,9 +152,14 @@ async def set_sources(sources: Dict[int, Dict[str, Union[str, int]]], conn: Conn
 
 
 @db
-async def set_post(post: Post, conn: Connection):
-    await conn.execute("""INSERT INTO posts(destination,message_id,source_channel_id,source_message_id,backup_id, 
-             reply_id,message_text,file_id) VALUES ($1, $2, $3,$4, $5, $6,$7, $8 );""",
+async def set_post(post: Post, conn: Connection) -> datetime:
+    """Store the post, returns its created_at."""
+    return await _insert_post(post, conn)
+
+
+async def _insert_post(post: Post, conn: Connection) -> datetime:
+    return await conn.fetchval("""INSERT INTO posts(destination,message_id,source_channel_id,source_message_id,backup_id, 
+             reply_id,message_text,file_id) VALUES ($1, $2, $3,$4, $5, $6,$7, $8 ) RETURNING created_at;""",
 
                        post.destination, post.message_id, post.source_channel_id, post.source_message_id,
                        post.backup_id,
@@ -163,11 +169,52 @@ async def set_post(post: Post, conn: Connection):
 @db
 async def get_post(source_channel_id: int, source_message_id: int, conn: Connection) -> Post:
     record: Record = await conn.fetchrow(
-        "select * from posts where source_channel_id =  $1 and source_message_id =  $2;",
+        "select * from posts where source_channel_id =  $1 and source_message_id =  $2 "
+        "order by created_at desc limit 1;",
         source_channel_id, source_message_id)
     return record_to_dataclass(record, Post)
 
 
+@db
+async def get_destination_post(backup_id: int, backup_channel: int, conn: Connection) -> Optional[Post]:
+    """The post that was spread from the given backup message, None if it went nowhere."""
+    record: Record = await conn.fetchrow(
+        "select * from posts where backup_id = $1 and destination <> $2 limit 1;", backup_id, backup_channel)
+    return record_to_dataclass(record, Post)
+
+
+# Replies announced by the collector before it forwards them, see ThreadMap
+REPLY_CHANNEL = "backup_replies"
+
+
+@db
+async def notify_reply(source_channel_id: int, source_message_id: int, reply_id: int, conn: Connection):
+    await conn.execute("SELECT pg_notify($1, $2);", REPLY_CHANNEL,
+                       f"{source_channel_id} {source_message_id} {reply_id}")
+
+
+async def listen_replies(callback: Callable[[int, int, int], None]) -> Optional[Connection]:
+    """Call back with (source channel, source message, parent backup id) for every announced reply.
+    Listens on a connection of its own, outside the pool. None in tests."""
+    if DBPool.is_test():
+        return None
+
+    def on_notify(connection: Connection, pid: int, channel: str, payload: str) -> None:
+        callback(*map(int, payload.split()))
+
+    conn = await connect(DATABASE_URL)
+    await conn.add_listener(REPLY_CHANNEL, on_notify)
+    return conn
+
+
+@db
+async def get_posted_keys(backup_channel: int, days: int, conn: Connection) -> List[Record]:
+    """Source keys of the posts spread to a destination during the last days."""
+    return await conn.fetch(
+        "select source_channel_id, source_message_id from posts "
+        "where destination <> $1 and created_at > now() - make_interval(days => $2);", backup_channel, days)
+
+
 @db
 async def set_destination(destination: Destination, conn: Connection):
     await conn.execute("INSERT INTO destinations( channel_id, name, group_id  ) VALUES ( $1, $2, $3)",
@@ -184,3 +231,120 @@ async def get_accounts(conn: Connection) -> List[Account]:
     records: List[Record] = await conn.fetch("select * from accounts;", )
     accs = [record_to_dataclass(r, Account) for r in records]
     return accs
+
+
+@db
+async def get_translation(key: str, ttl: int, conn: Connection) -> Optional[str]:
+    return await conn.fetchval(
+        "select translated_text from translations where key = $1 and created_at > now() - make_interval(secs => $2);",
+        key, ttl)
+
+
+@db
+async def set_translation(key: str, translated_text: str, conn: Connection):
+    await conn.execute("""INSERT INTO translations(key, translated_text) VALUES ($1, $2)
+             ON CONFLICT (key) DO UPDATE SET translated_text = EXCLUDED.translated_text, created_at = now();""",
+                       key, translated_text)
+
+
+@db
+async def delete_expired_translations(ttl: int, conn: Connection) -> str:
+    return await conn.execute("DELETE FROM translations WHERE created_at <= now() - make_interval(secs => $1);", ttl)
+
+
+@db
+async def get_route(key: str, ttl: int, conn: Connection) -> Optional[RouteDecision]:
+    record: Record = await conn.fetchrow(
+        "select region, confidence from routes where key = $1 and created_at > now() - make_interval(secs => $2);",
+        key, ttl)
+    return record_to_dataclass(record, RouteDecision)
+
+
+@db
+async def set_route(key: str, decision: RouteDecision, conn: Connection):
+    await conn.execute("""INSERT INTO routes(key, region, confidence) VALUES ($1, $2, $3)
+             ON CONFLICT (key) DO UPDATE SET region = EXCLUDED.region, confidence = EXCLUDED.confidence,
+             created_at = now();""",
+                       key, decision.region, decision.confidence)
+
+
+@db
+async def delete_expired_routes(ttl: int, conn: Connection) -> str:
+    return await conn.execute("DELETE FROM routes WHERE created_at <= now() - make_interval(secs => $1);", ttl)
+
+
+@db
+async def get_gazetteer(conn: Connection) -> Dict[str, Dict[str, float]]:
+    records: List[Record] = await conn.fetch(
+        "select lower(d.name) as region, g.keyword, g.weight from gazetteer g "
+        "join destinations d on d.channel_id = g.destination;")
+    result: Dict[str, Dict[str, float]] = {}
+    for r in records:
+        result.setdefault(r["region"], {})[r["keyword"]] = r["weight"]
+    return result
+
+
+@db
+async def set_backup_post(post: Post, media_group_id: Optional[str], quiet: float, max_wait: float,
+                          conn: Connection):
+    """Record the backup post and queue it for the processors, both or neither.
+    Album parts become visible together once the album is quiet."""
+    async with conn.transaction():
+        await _insert_post(post, conn)
+        await conn.execute("INSERT INTO jobs(backup_id, media_group_id, reply_id) VALUES ($1, $2, $3) "
+                           "ON CONFLICT (backup_id) DO NOTHING;", post.backup_id, media_group_id, post.reply_id)
+        if media_group_id:
+            await conn.execute(
+                "UPDATE jobs SET visible_at = LEAST(now() + make_interval(secs => $2), "
+                "created_at + make_interval(secs => $3)) WHERE media_group_id = $1 AND status = 'pending';",
+                media_group_id, quiet, max_wait)
+
+
+@db
+async def claim_jobs(worker: str, limit: int, visibility_timeout: float, max_attempts: int,
+                     conn: Connection) -> List[BackupJob]:
+    """Claim visible jobs, hidden from other processors for the visibility timeout."""
+    records: List[Record] = await conn.fetch(
+        """WITH claimed AS (
+               UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = $1,
+                      visible_at = now() + make_interval(secs => $3)
+               WHERE id IN (SELECT id FROM jobs
+                            WHERE status IN ('pending', 'running') AND visible_at <= now() AND attempts < $4
+                            ORDER BY id LIMIT $2 FOR UPDATE SKIP LOCKED)
+               RETURNING *)
+           SELECT c.*, c.media_group_id IS NULL OR NOT EXISTS (
+               SELECT 1 FROM jobs j WHERE j.media_group_id = c.media_group_id AND j.backup_id < c.backup_id) AS is_first
+           FROM claimed c ORDER BY c.id;""",
+        worker, limit, visibility_timeout, max_attempts)
+    return [record_to_dataclass(r, BackupJob) for r in records]
+
+
+@db
+async def extend_jobs(job_ids: List[int], worker: str, visibility_timeout: float, conn: Connection):
+    """Keep claimed jobs hidden while they are still being processed."""
+    await conn.execute("UPDATE jobs SET visible_at = now() + make_interval(secs => $3) "
+                       "WHERE id = ANY($1::bigint[]) AND locked_by = $2 AND status = 'running';",
+                       job_ids, worker, visibility_timeout)
+
+
+@db
+async def complete_job(job_id: int, conn: Connection):
+    await conn.execute("UPDATE jobs SET status = 'done', locked_by = NULL WHERE id = $1;", job_id)
+
+
+@db
+async def fail_job(job_id: int, error: str, retry_delay: float, max_attempts: int, conn: Connection):
+    """Make the job visible again after the delay, or give up on it after max_attempts."""
+    await conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts >= $4 THEN 'failed' ELSE 'pending' END, locked_by = NULL, "
+        "last_error = $2, visible_at = now() + make_interval(secs => $3) WHERE id = $1;",
+        job_id, error, retry_delay, max_attempts)
+
+
+@db
+async def purge_jobs(days: int, max_attempts: int, conn: Connection) -> str:
+    """Fail jobs that crashed too often and delete finished jobs older than days."""
+    await conn.execute("UPDATE jobs SET status = 'failed', locked_by = NULL "
+                       "WHERE status = 'running' AND visible_at <= now() AND attempts >= $1;", max_attempts)
+    return await conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') "
+                              "AND created_at <= now() - make_interval(days => $1);", days)
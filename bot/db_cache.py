@@ -3,6 +3,8 @@ Database caching layer to reduce redundant queries.
 Cache is stored in memory and refreshed only on-demand via /refresh command.
 Optimized for zero DB calls during message processing.
 """
+import hashlib
+import json
 import logging
 import time
 from typing import Dict, List, Optional, Tuple
@@ -12,8 +14,11 @@ from bot.db import (
     get_patterns as _get_patterns,
     get_footer as _get_footer,
     get_sources as _get_sources,
-    get_destinations as _get_destinations
+    get_destinations as _get_destinations,
+    get_gazetteer as _get_gazetteer
 )
+from bot.debloat import DebloatProgram, compile_debloat_program
+from bot.gazetteer import Gazetteer, build_gazetteer
 from bot.model import SourceDisplay, Destination
 
 
@@ -24,10 +29,13 @@ class DBCache:
         # Cache storage
         self._sources: Dict[int, SourceDisplay] = {}
         self._patterns: Dict[int, List[str]] = {}
+        self._debloat_programs: Dict[int, DebloatProgram] = {}  # Compiled patterns per source
         self._footers: Dict[int, Optional[str]] = {}
         self._destinations: List[Destination] = []
         self._destination_map: Dict[str, int] = {}  # Pre-computed name->id map
         self._destination_regions: List[str] = []    # Pre-computed region list
+        self._destination_version: str = ""          # Changes whenever the destination set does
+        self._gazetteer: Optional[Gazetteer] = None  # Keyword index over the destination regions
 
         # Track if cache has been initialized
         self._initialized: bool = False
@@ -88,6 +96,14 @@ class DBCache:
         """Get pre-computed list of region names (synchronous, no await)."""
         return self._destination_regions
 
+    def get_destination_version(self) -> str:
+        """Fingerprint of the current destination set, stable across restarts."""
+        return self._destination_version
+
+    def get_gazetteer(self) -> Optional[Gazetteer]:
+        """Get the compiled keyword index for local routing (synchronous, no await)."""
+        return self._gazetteer
+
     async def refresh_destinations(self) -> None:
         """Refresh destinations from database and pre-compute mappings."""
         logging.info("Refreshing destinations cache from database")
@@ -96,8 +112,19 @@ class DBCache:
         # Pre-compute mappings for O(1) lookups in routing
         self._destination_map = {d.name.lower(): d.channel_id for d in self._destinations}
         self._destination_regions = list(self._destination_map.keys())
+        self._destination_version = hashlib.sha256(
+            json.dumps(sorted(self._destination_map.items())).encode()).hexdigest()[:16]
         logging.info(f"Pre-computed destination map with {len(self._destination_map)} regions: {self._destination_regions}")
 
+        try:
+            rows = await _get_gazetteer()
+        except Exception as e:
+            # Destinations are refreshed already, routing keeps working with the bundled keywords
+            logging.warning(f"Loading gazetteer table failed, using res/gazetteer.json: {e}")
+            rows = {}
+        self._gazetteer = build_gazetteer(self._destination_regions, rows)
+        logging.info(f"Compiled gazetteer with {len(self._gazetteer)} keywords")
+
     async def get_patterns(self, channel_id: int) -> List[str]:
         """Get patterns for a channel from cache."""
         # Fast dict lookup using .get()
@@ -110,11 +137,26 @@ class DBCache:
         return patterns
 
     async def refresh_patterns(self, channel_id: int) -> None:
-        """Refresh patterns for a specific channel."""
+        """Refresh patterns for a specific channel and recompile its debloat program."""
         logging.info(f"Refreshing patterns cache for channel {channel_id}")
         patterns: List[str] = await _get_patterns(channel_id)
         self._patterns[channel_id] = patterns
 
+        program = self._debloat_programs.get(channel_id)
+        if program is not None:
+            self._debloat_programs[channel_id] = compile_debloat_program(patterns, program.username)
+
+    async def get_debloat_program(self, channel_id: int, username: Optional[str]) -> DebloatProgram:
+        """Get compiled debloat program for a channel, building it once when patterns load."""
+        program = self._debloat_programs.get(channel_id)
+        if program is None or program.username != username:
+            patterns = await self.get_patterns(channel_id)
+            program = compile_debloat_program(patterns, username)
+            self._debloat_programs[channel_id] = program
+            logging.info(f"Compiled debloat program for {channel_id} with {len(program.patterns)} patterns")
+
+        return program
+
     async def get_footer(self, channel_id: int) -> Optional[str]:
         """Get footer for a channel from cache."""
         # Check if already cached
@@ -168,6 +210,7 @@ class DBCache:
         if channel_id in self._patterns:
             del self._patterns[channel_id]
             logging.info(f"Invalidated patterns cache for {channel_id}")
+        self._debloat_programs.pop(channel_id, None)
 
     async def invalidate_footer(self, channel_id: int) -> None:
         """Invalidate footer cache for a specific channel."""
@@ -180,10 +223,13 @@ class DBCache:
         logging.info("Clearing all caches")
         self._sources.clear()
         self._patterns.clear()
+        self._debloat_programs.clear()
         self._footers.clear()
         self._destinations.clear()
         self._destination_map.clear()
         self._destination_regions.clear()
+        self._destination_version = ""
+        self._gazetteer = None
         self._recent_messages.clear()
         self._initialized = False
 
@@ -0,0 +1,35 @@
+"""
+Precompiled per-source debloat programs.
+Built once when a source's patterns are loaded, so the per-message path does no regex construction.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+import regex as re
+
+from constant import PATTERN_HTMLTAG
+from bot.matcher import PatternMatcher
+
+
+@dataclass
+class DebloatProgram:
+    patterns: List[str]
+    bloat: Optional[PatternMatcher] = None
+    username: Optional[str] = None
+    username_suffix: Optional[re.Pattern] = None
+
+
+def compile_debloat_program(patterns: Optional[List[str]], username: Optional[str]) -> DebloatProgram:
+    """Compile a source's bloat patterns and username suffix into one reusable program."""
+    patterns = patterns or []
+    program = DebloatProgram(patterns=patterns, username=username)
+
+    # Footers are matched literally with HTML stripped, like the text they are removed from
+    bloat = PatternMatcher(PATTERN_HTMLTAG.sub("", p) for p in patterns)
+    if bloat:
+        program.bloat = bloat
+
+    if username:
+        program.username_suffix = re.compile(f"@{re.escape(username)}$", flags=re.IGNORECASE)
+
+    return program
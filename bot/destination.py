@@ -1,17 +1,27 @@
 """
 Fast LLM-based regional routing using FREE OpenRouter models.
-Optimized with connection pooling, pre-computed mappings, and fallback models.
+Optimized with connection pooling, pre-computed mappings, and staggered racing of fallback models.
 """
 import json
 import logging
 import os
 import asyncio
-from typing import Optional, Dict, List, Any
+import time
+from collections import Counter, defaultdict
+from typing import Optional, Dict, List, Any, Callable, Set, Tuple, TypeVar
 
 from httpx import AsyncClient, Limits, HTTPStatusError
 
+from bot.classifier import get_router
+from bot.config import (CHANNEL_BACKUP, ROUTER_MIN_CONFIDENCE, ROUTING_STAGGER, ROUTING_BUDGET, ROUTING_BATCH_WINDOW,
+                        ROUTING_BATCH_SIZE, ROUTING_BATCH_CHARS)
+from bot.model import RouteDecision
+from bot.model_registry import ModelRegistry
+from bot.route_cache import get_route_cache
+
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Overridable to point the router at a local stand-in, see test/bench/mock_openrouter.py
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
 
 # FREE Models to try in order of preference
 # 1. Google Gemini 2.0 Flash Lite (Experimental/Free tier)
@@ -25,8 +35,23 @@ FREE_MODELS = [
     "mistralai/mistral-7b-instruct:free"
 ]
 
+# Below this the source's configured destination is used
+ROUTING_MIN_CONFIDENCE = 0.5
+# Characters of a post sent for classification and answer tokens allowed per post
+ROUTING_TEXT_LIMIT = 2000
+ROUTING_TOKENS_PER_POST = 100
+
+T = TypeVar("T")
+
+# Posts resolved by the gazetteer or learned router versus escalated to the route cache and LLM
+routing_stats: Counter = Counter()
+
+STATUS_TOO_MANY_REQUESTS = 429
+
 # Reuse HTTP client with connection pooling
 _http_client = None
+_model_registry: Optional[ModelRegistry] = None
+_routing_batcher: Optional["RoutingBatcher"] = None
 
 
 def get_http_client():
@@ -44,9 +69,19 @@ def get_http_client():
     return _http_client
 
 
-async def call_llm(model: str, prompt: str) -> Optional[str]:
-    """Make a single LLM call with error handling."""
+def get_model_registry() -> ModelRegistry:
+    """Get or create the health and rate-limit registry for FREE_MODELS."""
+    global _model_registry
+    if _model_registry is None:
+        _model_registry = ModelRegistry(FREE_MODELS)
+    return _model_registry
+
+
+async def call_llm(model: str, prompt: str, max_tokens: int = ROUTING_TOKENS_PER_POST) -> Optional[str]:
+    """Make a single LLM call with error handling. Outcomes are recorded in the model registry."""
     client = get_http_client()
+    registry = get_model_registry()
+    start = time.perf_counter()
     try:
         response = await client.post(
             OPENROUTER_URL,
@@ -60,26 +95,297 @@ async def call_llm(model: str, prompt: str) -> Optional[str]:
                 "model": model,
                 "messages": [{"role": "user", "content": prompt}],
                 "temperature": 0.1,
-                "max_tokens": 100,
+                "max_tokens": max_tokens,
                 "response_format": {"type": "json_object"}
             }
         )
         response.raise_for_status()
         result = response.json()
-        return result["choices"][0]["message"]["content"].strip()
+        content = result["choices"][0]["message"]["content"].strip()
+        registry.record_success(model, time.perf_counter() - start)
+        return content
+    except asyncio.CancelledError:
+        registry.release(model)
+        raise
     except HTTPStatusError as e:
         logging.warning(f"LLM call failed for model {model}: {e.response.status_code}")
+        if e.response.status_code == STATUS_TOO_MANY_REQUESTS:
+            registry.record_rate_limit(model, e.response.headers.get("Retry-After"))
+        else:
+            registry.record_failure(model)
     except Exception as e:
         logging.error(f"LLM call error for model {model}: {e}")
+        registry.record_failure(model)
+    return None
+
+
+REGION_CONTEXT = """Context for regions:
+- kaukasus: Armenia, Azerbaijan, Georgia
+- südamerika: South America
+- afrika: Africa  
+- ukraine: Ukraine, Russia-Ukraine war
+- asien: Asia, China, India, Japan, Korea, Southeast Asia
+- naher osten: Middle East, Syria, Iran, Turkey, Saudi Arabia, Israel, Palestine"""
+
+
+async def classify(text: str, regions: List[str], budget: float = ROUTING_BUDGET) -> Optional[RouteDecision]:
+    """Ask the LLM chain for the region of a text. None if no model gave a usable answer within budget seconds."""
+    # Construct a clear prompt for classification
+    prompt = f"""Classify the following news post into exactly ONE of these regions: {', '.join(regions)}.
+        
+{REGION_CONTEXT}
+
+Text: {text[:ROUTING_TEXT_LIMIT]}
+
+Return ONLY a JSON object: {{"region": "region_name", "confidence": 0.0-1.0}}"""
+
+    return await race_models(prompt, get_model_registry().ordered(), budget=budget)
+
+
+async def classify_batch(texts: List[str], regions: List[str],
+                         budget: float = ROUTING_BUDGET / 2) -> Optional[List[RouteDecision]]:
+    """Classify several texts with one request, None if no model returned one answer per text within budget seconds."""
+    posts = "\n\n".join(f"{i}. {text[:ROUTING_TEXT_LIMIT]}" for i, text in enumerate(texts, start=1))
+    prompt = f"""Classify each of the following {len(texts)} numbered news posts into exactly ONE of these regions: {', '.join(regions)}.
+
+{REGION_CONTEXT}
+
+Posts:
+{posts}
+
+Return ONLY a JSON object with one result per post, in the same order:
+{{"results": [{{"region": "region_name", "confidence": 0.0-1.0}}, ...]}}"""
+
+    return await race_models(prompt, get_model_registry().ordered(), budget=budget,
+                             parse=lambda content: parse_batch(content, len(texts)),
+                             max_tokens=ROUTING_TOKENS_PER_POST * len(texts))
+
+
+def _unwrap(content: str) -> str:
+    # Handle potential markdown wrapping
+    if "```" in content:
+        start = min((i for i in (content.find("{"), content.find("[")) if i != -1), default=-1)
+        end = max(content.rfind("}"), content.rfind("]")) + 1
+        if start != -1 and end > start:
+            content = content[start:end]
+    return content
+
+
+def _to_decision(data: Dict[str, Any]) -> RouteDecision:
+    return RouteDecision(region=str(data.get("region", "")).lower().strip(),
+                         confidence=float(data.get("confidence", 0.0)))
+
+
+def parse_decision(content: str) -> Optional[RouteDecision]:
+    """Parse a model answer, None if it is not the requested JSON object."""
+    try:
+        return _to_decision(json.loads(_unwrap(content)))
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError) as e:
+        logging.error(f"JSON parsing error: {e}, content: {content[:200]}")
+    return None
+
+
+def parse_batch(content: str, count: int) -> Optional[List[RouteDecision]]:
+    """Parse a batch answer, a JSON array or an object holding one. None unless it has exactly count results."""
+    try:
+        data = json.loads(_unwrap(content))
+        if isinstance(data, dict):
+            data = next((v for v in data.values() if isinstance(v, list)), None)
+        if isinstance(data, list) and len(data) == count:
+            return [_to_decision(d) for d in data]
+        logging.warning(f"Batch answer doesn't hold {count} results: {content[:200]}")
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError) as e:
+        logging.error(f"JSON parsing error: {e}, content: {content[:200]}")
     return None
 
 
+async def _ask(model: str, prompt: str, parse: Callable[[str], Optional[T]] = parse_decision,
+               max_tokens: int = ROUTING_TOKENS_PER_POST) -> Optional[T]:
+    registry = get_model_registry()
+    if not registry.acquire(model):
+        logging.info(f"Skipping {model}, benched or over its rate limit")
+        return None
+
+    content = await call_llm(model, prompt, max_tokens)
+    if not content:
+        return None
+
+    result = parse(content)
+    if result is None:
+        # Answered, but unusable, which is as bad as no answer for routing
+        registry.record_failure(model)
+    return result
+
+
+async def race_models(prompt: str, models: List[str] = FREE_MODELS, stagger: float = ROUTING_STAGGER,
+                      budget: float = ROUTING_BUDGET, parse: Callable[[str], Optional[T]] = parse_decision,
+                      max_tokens: int = ROUTING_TOKENS_PER_POST) -> Optional[T]:
+    """
+    Start the preferred model and add the next one whenever stagger seconds pass without a valid answer,
+    or right away when a model fails. The first valid answer wins and the remaining calls are cancelled.
+    None if no valid answer arrived within budget seconds.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    pending_models = list(models)
+    running: Dict[asyncio.Task, str] = {}
+    next_start = loop.time()
+
+    try:
+        while pending_models or running:
+            if pending_models and loop.time() >= next_start:
+                model = pending_models.pop(0)
+                running[asyncio.create_task(_ask(model, prompt, parse, max_tokens))] = model
+                next_start = loop.time() + stagger
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                logging.warning(f"Routing budget of {budget}s exhausted, models still running: {list(running.values())}")
+                return None
+
+            timeout = min(remaining, max(0.0, next_start - loop.time())) if pending_models else remaining
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                model = running.pop(task)
+                result = task.result()
+                if result is not None:
+                    logging.info(f"Routing answer from {model} after {budget - (deadline - loop.time()):.2f}s")
+                    return result
+                # Failed model, don't wait for the stagger before trying the next one
+                next_start = loop.time()
+
+        logging.error("All FREE LLM models failed to respond")
+        return None
+
+    finally:
+        for task in running:
+            task.cancel()
+
+
+class RoutingBatcher:
+    """
+    Collects texts to classify for a short window, or until a size or character budget is reached,
+    sends them as one numbered-list prompt and fans the results back to the waiting callers.
+    Falls back to single-item classification if the batch answer can't be used.
+    Every text has ROUTING_BUDGET seconds from being queued, spent on the batch and the fallback together.
+    """
+
+    def __init__(self, window: float = ROUTING_BATCH_WINDOW, max_items: int = ROUTING_BATCH_SIZE,
+                 max_chars: int = ROUTING_BATCH_CHARS) -> None:
+        self.window = window
+        self.max_items = max_items
+        self.max_chars = max_chars
+
+        # Pending jobs per region set, with the loop time their routing budget runs out
+        self._pending: Dict[Tuple[str, ...], List[Tuple[str, asyncio.Future, float]]] = defaultdict(list)
+        self._pending_chars: Dict[Tuple[str, ...], int] = defaultdict(int)
+        self._timers: Dict[Tuple[str, ...], asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.batched_texts = 0
+        self.failed_batches = 0
+
+    async def classify(self, text: str, regions: List[str]) -> Optional[RouteDecision]:
+        """Queue text for the next batch and wait for its decision."""
+        loop = asyncio.get_running_loop()
+        key = tuple(regions)
+        size = min(len(text), ROUTING_TEXT_LIMIT)
+
+        # Keep each request within the character budget
+        if self._pending[key] and self._pending_chars[key] + size > self.max_chars:
+            self._flush(key)
+
+        future = loop.create_future()
+        self._pending[key].append((text, future, loop.time() + ROUTING_BUDGET))
+        self._pending_chars[key] += size
+
+        if len(self._pending[key]) >= self.max_items or self._pending_chars[key] >= self.max_chars:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: Tuple[str, ...]) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(key, [])
+        self._pending_chars.pop(key, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send(batch, list(key)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future, float]], regions: List[str]) -> None:
+        if len(batch) == 1:
+            await self._single(*batch[0], regions)
+            return
+
+        texts = [text for text, _, _ in batch]
+        self.batches += 1
+        self.batched_texts += len(texts)
+
+        # Half of what is left to the earliest text, so the single-item fallback still has time if the batch fails
+        budget = (min(deadline for _, _, deadline in batch) - asyncio.get_running_loop().time()) / 2
+        try:
+            results = await classify_batch(texts, regions, budget)
+        except Exception as e:
+            logging.error(f"Batch routing error: {e}")
+            results = None
+
+        if results is not None:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            return
+
+        self.failed_batches += 1
+        logging.info(f"Batch of {len(batch)} failed, classifying one by one")
+        await asyncio.gather(*(self._single(text, future, deadline, regions) for text, future, deadline in batch))
+
+    @staticmethod
+    async def _single(text: str, future: asyncio.Future, deadline: float, regions: List[str]) -> None:
+        try:
+            budget = deadline - asyncio.get_running_loop().time()
+            result = await classify(text, regions, budget) if budget > 0 else None
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "texts": self.batched_texts,
+            "avg_batch": round(self.batched_texts / self.batches, 2) if self.batches else 0,
+            "failed": self.failed_batches,
+            "pending": sum(len(b) for b in self._pending.values()),
+        }
+
+
+def get_routing_batcher() -> RoutingBatcher:
+    """Get or create the global routing batcher."""
+    global _routing_batcher
+    if _routing_batcher is None:
+        _routing_batcher = RoutingBatcher()
+    return _routing_batcher
+
+
 async def route_message(text: str, default_dest: int, cache) -> int:
     """
     Route message to regional destination based on content.
+    Obvious cases are resolved by the local gazetteer, then the learned router is asked,
+    the rest goes to the (cached) LLM classification.
     Returns destination channel_id.
     """
-    if not text or not OPENROUTER_API_KEY:
+    if not text:
         return default_dest
 
     try:
@@ -88,55 +394,44 @@ async def route_message(text: str, default_dest: int, cache) -> int:
             logging.warning("No destinations in cache, using default")
             return default_dest
 
-        regions = cache.get_destination_regions()
-        
-        # Construct a clear prompt for classification
-        prompt = f"""Classify the following news post into exactly ONE of these regions: {', '.join(regions)}.
-        
-Context for regions:
-- kaukasus: Armenia, Azerbaijan, Georgia
-- südamerika: South America
-- afrika: Africa  
-- ukraine: Ukraine, Russia-Ukraine war
-- asien: Asia, China, India, Japan, Korea, Southeast Asia
-- naher osten: Middle East, Syria, Iran, Turkey, Saudi Arabia, Israel, Palestine
-
-Text: {text[:2000]}
+        gazetteer = cache.get_gazetteer()
+        decision = gazetteer.classify(text) if gazetteer is not None else None
+        if decision is not None:
+            routing_stats["local"] += 1
+            logging.info(f"Gazetteer Route → {decision.region.upper()} (share: {decision.confidence:.2f})")
+            return dest_map.get(decision.region, default_dest)
 
-Return ONLY a JSON object: {{"region": "region_name", "confidence": 0.0-1.0}}"""
+        prediction = get_router().predict(text)
+        if prediction is not None:
+            channel_id, confidence = prediction
+            # The backup channel is a destination too, but never a routing target
+            if (confidence >= ROUTER_MIN_CONFIDENCE and channel_id != CHANNEL_BACKUP
+                    and channel_id in dest_map.values()):
+                routing_stats["learned"] += 1
+                logging.info(f"Learned Route → {channel_id} (conf: {confidence:.2f})")
+                return channel_id
 
-        content = None
-        for model in FREE_MODELS:
-            content = await call_llm(model, prompt)
-            if content:
-                break
-        
-        if not content:
-            logging.error("All FREE LLM models failed to respond")
+        routing_stats["escalated"] += 1
+        if not OPENROUTER_API_KEY:
             return default_dest
 
-        # Clean and parse JSON
-        try:
-            # Handle potential markdown wrapping
-            if "```" in content:
-                start = content.find("{")
-                end = content.rfind("}") + 1
-                if start != -1 and end != -1:
-                    content = content[start:end]
-            
-            data = json.loads(content)
-            region = data.get("region", "").lower().strip()
-            confidence = data.get("confidence", 0.0)
-
-            if confidence >= 0.5 and region in dest_map:
-                channel_id = dest_map[region]
-                logging.info(f"LLM Route → {region.upper()} (conf: {confidence:.2f})")
-                return channel_id
-            else:
-                logging.info(f"Low confidence ({confidence:.2f}) or unknown region '{region}', using default")
+        # Identical texts were already classified against the same destination set
+        route_cache = get_route_cache()
+        version = cache.get_destination_version()
+        decision = await route_cache.get(text, version)
+        if decision is None:
+            decision = await get_routing_batcher().classify(text, cache.get_destination_regions())
+            if decision is None:
+                return default_dest
+            await route_cache.set(text, version, decision)
 
-        except (json.JSONDecodeError, KeyError) as e:
-            logging.error(f"JSON parsing error: {e}, content: {content[:200]}")
+        if decision.confidence >= ROUTING_MIN_CONFIDENCE and decision.region in dest_map:
+            channel_id = dest_map[decision.region]
+            logging.info(f"LLM Route → {decision.region.upper()} (conf: {decision.confidence:.2f})")
+            return channel_id
+        else:
+            logging.info(f"Low confidence ({decision.confidence:.2f}) or unknown region '{decision.region}', "
+                         f"using default")
 
     except Exception as e:
         logging.error(f"Routing error: {e}", exc_info=True)
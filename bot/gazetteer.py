@@ -0,0 +1,80 @@
+"""
+Local pre-routing by place names and other region keywords.
+Posts that clearly mention one region are routed in microseconds, only ambiguous ones are sent to the LLM.
+Keywords come from the gazetteer table, destinations without entries there use res/gazetteer.json.
+A trailing "*" marks a stem, which also matches inflected forms (e.g. "києв*" matches "Києві").
+"""
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from bot.config import GAZETTEER_MIN_SCORE, GAZETTEER_MIN_SHARE
+from bot.matcher import LiteralMatcher, fold
+from bot.model import RouteDecision
+
+GAZETTEER_PATH = Path(__file__).parent / "res" / "gazetteer.json"
+STEM_SUFFIX = "*"
+
+
+def load_builtin(path: Path = GAZETTEER_PATH) -> Dict[str, Dict[str, float]]:
+    with open(path, encoding="utf-8") as f:
+        return {region: {keyword: 1.0 for keyword in keywords} for region, keywords in json.load(f).items()}
+
+
+def _is_boundary(text: str, i: int) -> bool:
+    return i < 0 or i >= len(text) or not text[i].isalnum()
+
+
+class Gazetteer:
+    """Weighted keyword index over all regions, compiled into a single automaton."""
+
+    def __init__(self, entries: Dict[str, Dict[str, float]], min_score: float = GAZETTEER_MIN_SCORE,
+                 min_share: float = GAZETTEER_MIN_SHARE) -> None:
+        self.min_score = min_score
+        self.min_share = min_share
+        # keyword -> [(region, weight, is_stem)]
+        self._keywords: Dict[str, List[Tuple[str, float, bool]]] = defaultdict(list)
+
+        for region, keywords in entries.items():
+            for keyword, weight in keywords.items():
+                is_stem = keyword.endswith(STEM_SUFFIX)
+                keyword = fold(keyword.rstrip(STEM_SUFFIX).strip())
+                if keyword:
+                    self._keywords[keyword].append((region, weight, is_stem))
+
+        self._matcher = LiteralMatcher(self._keywords)
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Summed keyword weights per region. Keywords must start at a word, non-stems must also end at one."""
+        folded = fold(text)
+        scores: Dict[str, float] = defaultdict(float)
+        for start, end in self._matcher.finditer(folded):
+            if not _is_boundary(folded, start - 1):
+                continue
+            whole_word = _is_boundary(folded, end)
+            for region, weight, is_stem in self._keywords[folded[start:end]]:
+                if is_stem or whole_word:
+                    scores[region] += weight
+        return scores
+
+    def classify(self, text: str) -> Optional[RouteDecision]:
+        """Region if the text points at one clearly enough, None if the LLM has to decide."""
+        scores = self.scores(text)
+        if not scores:
+            return None
+
+        region = max(scores, key=scores.get)
+        share = scores[region] / sum(scores.values())
+        if scores[region] >= self.min_score and share >= self.min_share:
+            return RouteDecision(region=region, confidence=round(share, 3))
+        return None
+
+
+def build_gazetteer(regions: List[str], rows: Dict[str, Dict[str, float]]) -> Gazetteer:
+    """Gazetteer for the given regions. Table entries replace the built-in keywords of their region."""
+    builtin = load_builtin()
+    return Gazetteer({region: rows.get(region) or builtin.get(region, {}) for region in regions})
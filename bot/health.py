@@ -0,0 +1,162 @@
+"""
+Health tracking primitives for remote backends: moving averages, latency percentiles, circuit breakers
+and token buckets for client-side rate limiting.
+"""
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class Ewma:
+    """Exponentially weighted moving average."""
+
+    def __init__(self, alpha: float = 0.2, initial: Optional[float] = None) -> None:
+        self.alpha = alpha
+        self.value = initial
+
+    def update(self, sample: float) -> float:
+        self.value = sample if self.value is None else self.alpha * sample + (1 - self.alpha) * self.value
+        return self.value
+
+
+class LatencyWindow:
+    """Sliding window of recent latencies for percentile estimates."""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for reset_timeout seconds.
+    Afterwards a single trial call is let through (half-open), its outcome closes or reopens the circuit.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a call may be made now. Claims the trial call when half-open."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def available(self) -> bool:
+        """Like allow(), without claiming the half-open trial."""
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_running)
+
+    def release(self) -> None:
+        """Give back a claimed half-open trial whose call ended without a verdict (cancelled, rate limited)."""
+        self._trial_running = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class TokenBucket:
+    """Allows rate calls per second on average, with bursts of up to capacity calls."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self) -> bool:
+        self._refill()
+        return self.tokens >= 1
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available."""
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def delay(self) -> float:
+        """Seconds until a token is available."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class BackendHealth:
+    """Latency and error EWMAs, latency percentiles and a circuit breaker for one backend."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60.0) -> None:
+        self.name = name
+        self.latency = Ewma()
+        self.error_rate = Ewma(initial=0.0)
+        self.window = LatencyWindow()
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.calls = 0
+        self.errors = 0
+
+    def record_success(self, latency: float) -> None:
+        self.calls += 1
+        self.latency.update(latency)
+        self.window.add(latency)
+        self.error_rate.update(0.0)
+        self.breaker.record_success()
+
+    def record_failure(self) -> None:
+        self.calls += 1
+        self.errors += 1
+        self.error_rate.update(1.0)
+        self.breaker.record_failure()
+
+    def state(self) -> Dict[str, Any]:
+        p95 = self.window.percentile(95)
+        return {
+            "circuit": self.breaker.state,
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate.value, 3),
+            "latency_ms": round(self.latency.value * 1000, 1) if self.latency.value is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
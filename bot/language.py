@@ -0,0 +1,161 @@
+"""
+Offline language identification, used to skip translating posts that are already in the target language.
+Latin-script text is scored with a character trigram model built from the seed texts in res/languages.json,
+combined with the share of each language's function words. Other scripts are identified by their letters.
+No network access involved.
+"""
+import json
+import logging
+import math
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import regex as re
+
+PROFILE_PATH = Path(__file__).parent / "res" / "languages.json"
+
+PATTERN_MARKUP = re.compile(r"<[^>]+>|https?://\S+|[@#]\w+")
+PATTERN_NON_LETTER = re.compile(r"[^\p{L}]+")
+
+# Letters that only occur in one of the two Cyrillic languages we receive
+UKRAINIAN_LETTERS = set("іїєґ")
+RUSSIAN_LETTERS = set("ыэъё")
+
+# Text shorter than this (in letters) is not classified
+MIN_LETTERS = 20
+# Function words are the strongest signal in short posts, so they also count several times in the profile
+FUNCTION_WORD_WEIGHT = 5
+# Keeps languages without any function word hit in the race, so trigrams alone can still decide
+FUNCTION_WORD_PRIOR = 0.01
+
+
+def _features(text: str) -> Counter:
+    """Character trigrams plus whole words, prefixed to keep them apart from trigrams."""
+    padded = f" {text} "
+    features = Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+    features.update(f"_{w}" for w in text.split())
+    return features
+
+
+def _clean(text: str) -> str:
+    text = PATTERN_MARKUP.sub(" ", text)
+    return PATTERN_NON_LETTER.sub(" ", text).lower().strip()
+
+
+class LanguageDetector:
+    """
+    Naive Bayes over character trigrams and words with add-one smoothing,
+    weighted by how many of the text's words are function words of each language.
+    """
+
+    def __init__(self, profiles: Dict[str, Dict[str, str]]) -> None:
+        self._log_probs: Dict[str, Dict[str, float]] = {}
+        self._unseen: Dict[str, float] = {}
+        self._function_words: Dict[str, set] = {lang: set(p["words"].split()) for lang, p in profiles.items()}
+        # Words shared by several languages (e.g. "in") count proportionally less
+        self._word_share = Counter(w for words in self._function_words.values() for w in words)
+
+        for lang, profile in profiles.items():
+            counts = _features(_clean(profile["text"]))
+            for word in profile["words"].split():
+                counts[f"_{word}"] += FUNCTION_WORD_WEIGHT
+            total = sum(counts.values()) + len(counts) + 1
+            self._log_probs[lang] = {t: math.log((n + 1) / total) for t, n in counts.items()}
+            self._unseen[lang] = math.log(1 / total)
+
+    @classmethod
+    def from_file(cls, path: Path = PROFILE_PATH) -> "LanguageDetector":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def detect(self, text: str) -> Tuple[str, float]:
+        """Return (language code, confidence). "und" if the text is too short or unknown."""
+        text = _clean(text)
+        letters = [c for c in text if c != " "]
+        if len(letters) < MIN_LETTERS:
+            return "und", 0.0
+
+        cyrillic = sum(1 for c in letters if "Ѐ" <= c <= "ӿ")
+        if cyrillic > len(letters) / 2:
+            return self._detect_cyrillic(letters, cyrillic)
+
+        latin = sum(1 for c in letters if c.isascii() or "À" <= c <= "ɏ")
+        if latin < len(letters) / 2:
+            return "und", 0.0
+
+        features = _features(text)
+        scores = {
+            lang: sum(n * probs.get(f, self._unseen[lang]) for f, n in features.items())
+            for lang, probs in self._log_probs.items()
+        }
+
+        # Trigram posterior, damped so long texts don't saturate instantly
+        scale = sum(features.values()) ** 0.5
+        best = max(scores.values())
+        weights = {lang: math.exp((score - best) / scale) for lang, score in scores.items()}
+
+        words = text.split()
+        for lang, function_words in self._function_words.items():
+            share = sum(1 / self._word_share[w] for w in words if w in function_words) / len(words)
+            weights[lang] *= share + FUNCTION_WORD_PRIOR
+
+        lang = max(weights, key=weights.get)
+        return lang, weights[lang] / sum(weights.values())
+
+    @staticmethod
+    def _detect_cyrillic(letters, cyrillic: int) -> Tuple[str, float]:
+        uk = sum(1 for c in letters if c in UKRAINIAN_LETTERS)
+        ru = sum(1 for c in letters if c in RUSSIAN_LETTERS)
+        if uk == ru:
+            return "ru" if uk else "und", 0.5
+        lang = "uk" if uk > ru else "ru"
+        return lang, max(uk, ru) / (uk + ru) * cyrillic / len(letters)
+
+
+class LanguageStats:
+    """Per-source counts of detected languages, to find sources that can be pinned as 'no translation needed'."""
+
+    def __init__(self, min_posts: int = 50, pin_share: float = 0.95) -> None:
+        self.min_posts = min_posts
+        self.pin_share = pin_share
+        self._counts: Dict[int, Counter] = defaultdict(Counter)
+        self._suggested: set = set()
+
+    def record(self, source_id: int, lang: str, target_lang: str = "de") -> None:
+        counts = self._counts[source_id]
+        counts[lang] += 1
+
+        total = sum(counts.values())
+        if (source_id not in self._suggested and total >= self.min_posts
+                and counts[target_lang] / total >= self.pin_share):
+            self._suggested.add(source_id)
+            logging.info(f"Source {source_id} posts in '{target_lang}' {counts[target_lang]}/{total} times, "
+                         f"consider pinning: UPDATE sources SET language = '{target_lang}' "
+                         f"WHERE channel_id = {source_id};")
+
+    def get(self, source_id: int) -> Dict[str, int]:
+        return dict(self._counts.get(source_id, {}))
+
+    def state(self) -> Dict[int, Dict[str, int]]:
+        return {source_id: dict(counts) for source_id, counts in self._counts.items()}
+
+
+_detector: Optional[LanguageDetector] = None
+_stats: Optional[LanguageStats] = None
+
+
+def get_detector() -> LanguageDetector:
+    """Get or create the global language detector."""
+    global _detector
+    if _detector is None:
+        _detector = LanguageDetector.from_file()
+    return _detector
+
+
+def get_language_stats() -> LanguageStats:
+    """Get or create the global per-source language stats."""
+    global _stats
+    if _stats is None:
+        _stats = LanguageStats()
+    return _stats
@@ -0,0 +1,62 @@
+"""
+Bounded in-memory LRU cache with per-entry TTL.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Least-recently-used cache. Entries older than ttl seconds are treated as missing."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """Return cached value and mark it as recently used, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        """Store value, evicting the least recently used entry if full."""
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        entry = self._data.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def evict_expired(self) -> int:
+        """Drop all expired entries. Returns number of evicted entries."""
+        if self.ttl is None:
+            return 0
+
+        now = time.monotonic()
+        expired = [k for k, (stored_at, _) in self._data.items() if now - stored_at > self.ttl]
+        for k in expired:
+            del self._data[k]
+        return len(expired)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
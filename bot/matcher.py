@@ -0,0 +1,131 @@
+"""
+Multi-pattern matching for bloat and blacklist entries.
+Literal strings are compiled into an Aho-Corasick automaton and found in a single linear pass,
+whatever the number of patterns. Below about 50 patterns a regex alternation is faster and used instead,
+see test/bench/bench_matcher.py.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import regex as re
+
+# Pattern count from which the automaton beats the regex alternation
+AUTOMATON_MIN_PATTERNS = 50
+
+
+def fold(text: str) -> str:
+    """Lowercase text while keeping a 1:1 character mapping, so match offsets stay valid."""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    # Rare characters like "İ" lowercase to two code points, keep those unchanged
+    return "".join(c if len(lc := c.lower()) != 1 else lc for c in text)
+
+
+class LiteralMatcher:
+    """Case-insensitive Aho-Corasick automaton over literal strings."""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._length: List[int] = [0]  # Pattern length if the state ends a pattern
+        self._output: List[int] = [-1]  # Next pattern-ending state along the fail chain
+
+        for pattern in patterns:
+            if pattern:
+                self._add(fold(pattern))
+        self._build()
+
+    def __len__(self) -> int:
+        return sum(1 for n in self._length if n)
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for c in pattern:
+            nxt = self._goto[state].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._length.append(0)
+                self._output.append(-1)
+                self._goto[state][c] = nxt
+            state = nxt
+        self._length[state] = len(pattern)
+
+    def _build(self) -> None:
+        # Breadth-first, so fail targets are always resolved before their children
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for c, child in self._goto[state].items():
+                queue.append(child)
+                f = self._fail[state]
+                while f and c not in self._goto[f]:
+                    f = self._fail[f]
+                fail = self._goto[f].get(c, 0)
+                self._fail[child] = fail
+                self._output[child] = fail if self._length[fail] else self._output[fail]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) of every, possibly overlapping, occurrence in order of end position."""
+        goto, fail, length, output = self._goto, self._fail, self._length, self._output
+        state = 0
+        for i, c in enumerate(fold(text)):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+
+            s = state if length[state] else output[state]
+            while s > 0:
+                yield i + 1 - length[s], i + 1
+                s = output[s]
+
+    def search(self, text: str) -> bool:
+        return next(self.finditer(text), None) is not None
+
+    def spans(self, text: str) -> List[Tuple[int, int]]:
+        """Non-overlapping occurrences, preferring the leftmost and then the longest match."""
+        result = []
+        last_end = 0
+        for start, end in sorted(self.finditer(text), key=lambda m: (m[0], -m[1])):
+            if start >= last_end:
+                result.append((start, end))
+                last_end = end
+        return result
+
+
+class PatternMatcher:
+    """Case-insensitive literal patterns. Small sets are matched by one regex alternation, which is faster there,
+    from automaton_min patterns on by the automaton, whose cost doesn't grow with their number."""
+
+    def __init__(self, patterns: Iterable[str], automaton_min: int = AUTOMATON_MIN_PATTERNS) -> None:
+        patterns = [p for p in patterns if p]
+        self.automaton: Optional[LiteralMatcher] = None
+        self.expression: Optional[re.Pattern] = None
+        if len(patterns) >= automaton_min:
+            self.automaton = LiteralMatcher(patterns)
+        elif patterns:
+            self.expression = re.compile(f"(?:{'|'.join(re.escape(p) for p in patterns)})", flags=re.IGNORECASE)
+
+    def __bool__(self) -> bool:
+        return self.automaton is not None or self.expression is not None
+
+    def search(self, text: str) -> bool:
+        if self.automaton is not None:
+            return self.automaton.search(text)
+        return self.expression is not None and self.expression.search(text) is not None
+
+    def remove(self, text: str) -> Tuple[str, int]:
+        """Remove all occurrences. Returns the new text and the number of removed matches."""
+        if self.expression is not None:
+            return self.expression.subn("", text)
+        if self.automaton is None:
+            return text, 0
+
+        spans = self.automaton.spans(text)
+        parts = []
+        last = 0
+        for start, end in spans:
+            parts.append(text[last:start])
+            last = end
+        parts.append(text[last:])
+        return "".join(parts), len(spans)
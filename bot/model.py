@@ -29,6 +29,7 @@ class SourceDisplay:
     username: Optional[str] = None
     detail_id: Optional[int] = None
     destination: Optional[int] = None
+    language: Optional[str] = None
 
 
 @dataclass
@@ -67,3 +68,21 @@ class Destination:
     channel_id: int
     name: str
     group_id: Optional[int]
+
+
+@dataclass
+class RouteDecision:
+    region: str
+    confidence: float
+
+
+@dataclass
+class BackupJob:
+    id: int
+    backup_id: int
+    media_group_id: Optional[str] = None
+    attempts: int = 0
+    # Backup message of the source message this one replies to
+    reply_id: Optional[int] = None
+    # Whether this is the first part of its media group, which stands for the whole album
+    is_first: bool = True
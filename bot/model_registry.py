@@ -0,0 +1,115 @@
+"""
+Per-model health and rate-limit tracking for the OpenRouter routing models.
+Models that keep failing are benched by their circuit breaker, rate-limited ones for their Retry-After period,
+and a token bucket per model keeps us below the free-tier request limits in the first place.
+"""
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+from bot.config import (ROUTING_MODEL_RPM, ROUTING_MODEL_BURST, ROUTING_RATE_LIMIT_BENCH, ROUTING_BREAKER_FAILURES,
+                        ROUTING_BREAKER_RESET, ROUTING_STAGGER)
+from bot.health import BackendHealth, TokenBucket
+
+# Lowest success rate used for ranking, so a failing model ranks last instead of dividing by zero
+MIN_SUCCESS_RATE = 0.05
+
+
+def parse_retry_after(value: Optional[str], default: float = ROUTING_RATE_LIMIT_BENCH) -> float:
+    """Seconds from a Retry-After header, which is either a number of seconds or an HTTP date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class ModelState:
+    """Health, rate-limit bench and token bucket of one model."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.health = BackendHealth(name, ROUTING_BREAKER_FAILURES, ROUTING_BREAKER_RESET)
+        self.bucket = TokenBucket(ROUTING_MODEL_RPM / 60, ROUTING_MODEL_BURST)
+        self.rate_limited = 0
+        self.throttled = 0
+        self.benched_until = 0.0
+
+    def benched(self) -> bool:
+        return time.monotonic() < self.benched_until
+
+    def available(self) -> bool:
+        return not self.benched() and self.health.breaker.available() and self.bucket.available()
+
+    def expected_latency(self) -> float:
+        """Average latency divided by the success rate, i.e. the expected time until a usable answer."""
+        latency = self.health.latency.value if self.health.latency.value is not None else ROUTING_STAGGER
+        return latency / max(1 - self.health.error_rate.value, MIN_SUCCESS_RATE)
+
+    def state(self) -> Dict[str, Any]:
+        state = self.health.state()
+        state["rate_limited"] = self.rate_limited
+        state["throttled"] = self.throttled
+        state["benched_for"] = round(max(0.0, self.benched_until - time.monotonic()), 1)
+        state["tokens"] = round(self.bucket.tokens, 2)
+        return state
+
+
+class ModelRegistry:
+    """Ranks the configured models by observed performance and guards every call."""
+
+    def __init__(self, models: List[str]) -> None:
+        self.models = list(models)
+        self._states: Dict[str, ModelState] = {}
+
+    def _get(self, model: str) -> ModelState:
+        state = self._states.get(model)
+        if state is None:
+            state = self._states[model] = ModelState(model)
+        return state
+
+    def ordered(self) -> List[str]:
+        """Usable models, fastest expected answer first. Ties keep the configured preference."""
+        available = [m for m in self.models if self._get(m).available()]
+        if len(available) < len(self.models):
+            logging.info(f"Routing models unavailable: {[m for m in self.models if m not in available]}")
+        return sorted(available, key=lambda m: self._get(m).expected_latency())
+
+    def acquire(self, model: str) -> bool:
+        """Whether a call to model may be made now. Claims a rate-limit token and the breaker trial."""
+        state = self._get(model)
+        if state.benched() or not state.health.breaker.available():
+            return False
+        if not state.bucket.try_acquire():
+            state.throttled += 1
+            return False
+        return state.health.breaker.allow()
+
+    def record_success(self, model: str, latency: float) -> None:
+        self._get(model).health.record_success(latency)
+
+    def record_failure(self, model: str) -> None:
+        self._get(model).health.record_failure()
+
+    def release(self, model: str) -> None:
+        """The call was cancelled before it had an outcome."""
+        self._get(model).health.breaker.release()
+
+    def record_rate_limit(self, model: str, retry_after: Optional[str]) -> None:
+        """Bench the model for the Retry-After period. Doesn't count towards the breaker, the model isn't broken."""
+        state = self._get(model)
+        seconds = parse_retry_after(retry_after)
+        state.rate_limited += 1
+        state.benched_until = max(state.benched_until, time.monotonic() + seconds)
+        state.health.breaker.release()
+        logging.warning(f"Model {model} rate limited, benched for {seconds:.0f}s")
+
+    def state(self) -> Dict[str, Dict[str, Any]]:
+        return {model: self._get(model).state() for model in self.models}
+
@@ -0,0 +1,68 @@
+"""
+In-memory index of the source messages that were already spread to a destination.
+Answers the dedup check of every backup message without a database round trip. Keys are packed into one int
+per (source channel, message) pair. Bulk-loaded for the recent posts at startup and extended on every post,
+so it is exact for everything this processor posted since then.
+"""
+import logging
+import time
+from typing import Dict, Optional, Set
+
+from bot.config import CHANNEL_BACKUP, POSTED_INDEX_DAYS
+from bot.db import get_posted_keys
+
+# Message ids are positive 32-bit ints, the channel id goes above them
+MESSAGE_BITS = 32
+
+
+def pack(channel_id: int, message_id: int) -> int:
+    return (channel_id << MESSAGE_BITS) | message_id
+
+
+class PostedIndex:
+    """Set of packed source keys of spread posts."""
+
+    def __init__(self) -> None:
+        self._keys: Set[int] = set()
+        self.loaded = False
+
+        # Counters for monitoring
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, channel_id: int, message_id: int) -> None:
+        self._keys.add(pack(channel_id, message_id))
+
+    def contains(self, channel_id: int, message_id: int) -> bool:
+        if pack(channel_id, message_id) in self._keys:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    async def load(self, days: int = POSTED_INDEX_DAYS) -> None:
+        """Add the posts spread during the last days."""
+        start_time = time.perf_counter()
+        records = await get_posted_keys(CHANNEL_BACKUP, days)
+        self._keys.update(pack(r["source_channel_id"], r["source_message_id"]) for r in records)
+        self.loaded = True
+        elapsed = (time.perf_counter() - start_time) * 1000
+        logging.info(f"Posted index loaded {len(records)} posts of the last {days} days in {elapsed:.2f}ms")
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._keys), "hits": self.hits, "misses": self.misses}
+
+
+# Global index instance
+_posted_index: Optional[PostedIndex] = None
+
+
+def get_posted_index() -> PostedIndex:
+    """Get or create the global posted index instance."""
+    global _posted_index
+    if _posted_index is None:
+        _posted_index = PostedIndex()
+    return _posted_index
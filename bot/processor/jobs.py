@@ -0,0 +1,120 @@
+"""
+Consumes the durable job queue written by the collector.
+Jobs are claimed with FOR UPDATE SKIP LOCKED, so several processors can share the queue, and stay hidden for the
+visibility timeout. A processor that crashes leaves its jobs to be claimed again once that passes, nothing
+forwarded while it was down is lost. Jobs are acknowledged once they left the pipeline, failures are retried.
+"""
+import asyncio
+import logging
+import os
+import socket
+from collections import Counter
+from typing import Dict, Set
+
+from pyrogram import Client
+
+from bot.config import (CHANNEL_BACKUP, JOB_BATCH, JOB_VISIBILITY_TIMEOUT, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY,
+                        JOB_POLL_INTERVAL)
+from bot.db import claim_jobs, complete_job, extend_jobs, fail_job
+from bot.model import BackupJob
+from bot.processor.pipeline import Job, Pipeline
+
+# Claimed jobs are extended this often per visibility timeout, so one failed heartbeat doesn't expose them
+HEARTBEATS_PER_TIMEOUT = 3
+
+
+class JobConsumer:
+    """Claims jobs, feeds their backup messages to the pipeline and acknowledges them."""
+
+    def __init__(self, client: Client, pipeline: Pipeline) -> None:
+        self.client = client
+        self.pipeline = pipeline
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks: Set[asyncio.Task] = set()
+        # Claimed and not yet acknowledged, their visibility is extended until they are
+        self._leases: Dict[int, BackupJob] = {}
+        self.outcomes: Counter = Counter()
+
+    async def run(self) -> None:
+        logging.info(f"Consuming jobs as {self.worker}")
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            await self._consume()
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self) -> None:
+        """Jobs can wait behind a full pipeline or a FloodWait for longer than the visibility timeout,
+        keep them hidden so no other processor sends them a second time."""
+        while True:
+            await asyncio.sleep(JOB_VISIBILITY_TIMEOUT / HEARTBEATS_PER_TIMEOUT)
+            if not self._leases:
+                continue
+            try:
+                await extend_jobs(list(self._leases), self.worker, JOB_VISIBILITY_TIMEOUT)
+            except Exception as e:
+                logging.error(f"Extending {len(self._leases)} jobs failed: {e}")
+
+    async def _consume(self) -> None:
+        while True:
+            try:
+                jobs = await claim_jobs(self.worker, JOB_BATCH, JOB_VISIBILITY_TIMEOUT, JOB_MAX_ATTEMPTS)
+            except Exception as e:
+                logging.error(f"Claiming jobs failed: {e}")
+                jobs = []
+
+            if not jobs:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+
+            self._leases.update((job.id, job) for job in jobs)
+            for job in jobs:
+                # Waits while the pipeline is full
+                await self.submit(job)
+
+    async def submit(self, backup_job: BackupJob) -> None:
+        if not backup_job.is_first:
+            # The album is copied with its first part
+            await self.acknowledge(backup_job, "album part")
+            return
+
+        try:
+            message = await self.client.get_messages(CHANNEL_BACKUP, backup_job.backup_id)
+        except Exception as e:
+            await self.acknowledge(backup_job, "failed", f"Fetching the backup message failed: {e}")
+            return
+        if message.empty:
+            await self.acknowledge(backup_job, "deleted")
+            return
+
+        job = Job(self.client, message, is_media_group=bool(message.media_group_id), attempt=backup_job.attempts,
+                  reply_backup_id=backup_job.reply_id,
+                  outcome=asyncio.get_running_loop().create_future())
+        await self.pipeline.submit(job)
+
+        task = asyncio.create_task(self._wait(backup_job, job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _wait(self, backup_job: BackupJob, job: Job) -> None:
+        outcome = await job.outcome
+        await self.acknowledge(backup_job, outcome, f"Processing failed in attempt {backup_job.attempts}")
+
+    async def acknowledge(self, backup_job: BackupJob, outcome: str, error: str = "") -> None:
+        self.outcomes[outcome] += 1
+        self._leases.pop(backup_job.id, None)
+        try:
+            if outcome == "failed":
+                logging.warning(f"Job {backup_job.id} for backup message {backup_job.backup_id}: {error}")
+                await fail_job(backup_job.id, error, JOB_RETRY_DELAY, JOB_MAX_ATTEMPTS)
+            else:
+                await complete_job(backup_job.id)
+        except Exception as e:
+            # The job becomes visible again after the timeout, the dedup check catches it if it was posted
+            logging.error(f"Acknowledging job {backup_job.id} failed: {e}")
+
+    def state(self) -> Dict[str, int]:
+        state = dict(self.outcomes)
+        state["in_pipeline"] = len(self._tasks)
+        state["leased"] = len(self._leases)
+        return state
@@ -4,27 +4,35 @@ import time
 from datetime import datetime, timedelta
 from typing import List, Final, Optional, Dict
 import os
-from collections import defaultdict
 from pathlib import Path
 
 from pyrogram import Client, filters, compose
 from pyrogram.enums import ParseMode
-from pyrogram.errors import MessageNotModified
+from pyrogram.errors import MessageNotModified, RPCError
 from pyrogram.types import Message, InputMediaVideo, InputMediaPhoto
 
-from bot.config import CHANNEL_BACKUP, PASSWORD, CONTAINER, GROUP_LOG, CHANNEL_UA
-from bot.db import get_accounts, get_post, set_post
+from bot.config import (CHANNEL_BACKUP, PASSWORD, CONTAINER, GROUP_LOG, CHANNEL_UA, STATS_INTERVAL, ROUTE_ON_TRANSLATION,
+                        PIPELINE_STAGES, PIPELINE_WORKERS, PIPELINE_QUEUE_SIZE, JOB_QUEUE, JOB_RETENTION_DAYS,
+                        JOB_MAX_ATTEMPTS)
+from bot.classifier import get_router, reload_router
+from bot.db import get_accounts, get_post, set_post, purge_jobs
 from bot.db_cache import get_cache
-from bot.destination import get_destination
+from bot.language import get_language_stats
+from bot.destination import get_destination, get_model_registry, get_routing_batcher, routing_stats
 from bot.model import Post
-from bot.translation import debloat_text, format_text, translate
+from bot.posted_index import get_posted_index
+from bot.processor.jobs import JobConsumer
+from bot.processor.media_group import MediaGroupAssembler
+from bot.processor.outbound import get_outbound
+from bot.processor.pipeline import Job, Pipeline, Stage
+from bot.route_cache import get_route_cache
+from bot.thread_map import get_thread_map
+from bot.translation import debloat_message, translate_debloated, format_text, translate
+from bot.translation_cache import get_translation_cache
+from bot.translator import get_scheduler
 from bot.extension.militarnyi import get_militarnyi
 from bot.extension.postillon import get_postillon
 
-# MediaGroup buffering
-media_groups = defaultdict(list)
-media_group_locks = defaultdict(asyncio.Lock)
-
 def add_logging():
     level = logging.INFO
     format_str = "%(asctime)s %(levelname)-5s %(funcName)-20s [%(filename)s:%(lineno)d]: %(message)s"
@@ -57,13 +65,13 @@ async def handle_extensions(client: Client, message: Message, cache):
             medias.append(InputMediaPhoto(v))
         
         if medias:
-            caption = await format_text(translate(cp.caption), message, source, message.id, cache)
+            caption = await format_text(await translate(cp.caption), message, source, message.id, cache)
             medias[0].caption = caption
             msgs = await client.send_media_group(CHANNEL_UA, medias)
             msg = msgs[0]
             
             for text in cp.texts:
-                text = await format_text(translate(text), message, source, message.id, cache)
+                text = await format_text(await translate(text), message, source, message.id, cache)
                 await client.send_message(CHANNEL_UA, text, reply_to_message_id=msg.id, disable_web_page_preview=True)
             
             for f in cp.image_urls + cp.video_urls:
@@ -83,121 +91,223 @@ async def handle_extensions(client: Client, message: Message, cache):
             
     return False
 
-async def process_message_logic(client: Client, message: Message, cache, is_media_group=False):
-    """Core processing logic for a single message or the first message of a media group."""
-    start_time = time.perf_counter()
-    
-    # 1. Identify original source from forward info
+async def check_posted(job: Job) -> bool:
+    """Dedup stage: drops forwards of posts already spread, sources not marked for spreading and extension posts."""
+    message = job.message
+    cache = get_cache()
+
+    # Identify original source from forward info
     if not message.forward_from_chat:
         logging.warning(f"Message {message.id} in backup is not a forward, skipping")
-        return None
-        
-    source_chat_id = message.forward_from_chat.id
-    source_msg_id = message.forward_from_message_id
-    
-    # 2. Check if already posted (Database lookup)
-    existing_post = await get_post(source_chat_id, source_msg_id)
-    if existing_post and existing_post.destination != CHANNEL_BACKUP:
-        logging.info(f"Message {source_chat_id}/{source_msg_id} already posted to {existing_post.destination}, skipping")
-        return None
-        
-    # 3. Check if source should be spread
-    source = await cache.get_source(source_chat_id)
-    if not source or not source.is_spread:
-        logging.info(f"Source {source_chat_id} is not marked for spreading, skipping")
-        return None
-
-    # 4. Handle Extensions
-    if await handle_extensions(client, message, cache):
-        return None
-        
-    # 5. Debloat and prepare text
-    text = await debloat_text(message, client, cache, is_caption=bool(message.caption or message.text))
-    if not text:
-        logging.info(f"Message {source_chat_id}/{source_msg_id} has no text after debloating, skipping")
-        return None
-        
-    # 6. Content-based routing (LLM)
-    destination = await get_destination(text, source_chat_id, cache)
-    if not destination:
-        logging.warning(f"No destination determined for message {source_chat_id}/{source_msg_id}")
-        return None
-        
-    # 7. Format with footer
-    footer = await cache.get_footer(destination)
-    formatted_text = await format_text(text, message, source, message.id, footer)
-    
-    # 8. Handle Replies
-    reply_to_id = None
-    if message.reply_to_message_id:
-        # Find the post in the destination channel that corresponds to the replied-to message in backup
-        reply_post = await get_post(CHANNEL_BACKUP, message.reply_to_message_id)
-        if reply_post:
-            dest_post = await get_post(reply_post.source_channel_id, reply_post.source_message_id)
-            if dest_post and dest_post.destination == destination:
-                reply_to_id = dest_post.message_id
-
-    # 9. Post to destination
-    try:
-        if is_media_group:
-            msgs = await client.copy_media_group(
-                destination,
+        return False
+
+    job.source_chat_id = message.forward_from_chat.id
+    job.source_msg_id = message.forward_from_message_id
+
+    # Check if already posted, in memory unless the index couldn't be loaded
+    # Retried jobs are checked in the database, another processor may have posted them
+    posted_index = get_posted_index()
+    if posted_index.loaded and job.attempt == 1:
+        if posted_index.contains(job.source_chat_id, job.source_msg_id):
+            logging.info(f"Message {job.source_chat_id}/{job.source_msg_id} already posted, skipping")
+            return False
+    else:
+        job.existing_post = await get_post(job.source_chat_id, job.source_msg_id)
+        if job.existing_post and job.existing_post.destination != CHANNEL_BACKUP:
+            logging.info(f"Message {job.source_chat_id}/{job.source_msg_id} already posted to "
+                         f"{job.existing_post.destination}, skipping")
+            return False
+
+    # Check if source should be spread
+    job.source = await cache.get_source(job.source_chat_id)
+    if not job.source or not job.source.is_spread:
+        logging.info(f"Source {job.source_chat_id} is not marked for spreading, skipping")
+        return False
+
+    return not await handle_extensions(job.client, message, cache)
+
+
+async def debloat(job: Job) -> bool:
+    job.original = await debloat_message(job.message, job.client, get_cache())
+    if not job.original:
+        logging.info(f"Message {job.source_chat_id}/{job.source_msg_id} has no text after debloating, skipping")
+        return False
+    return True
+
+
+async def translate_job(job: Job) -> bool:
+    job.text = await translate_debloated(job.original, job.source_chat_id, get_cache(),
+                                         is_caption=bool(job.message.caption or job.message.text))
+    return True
+
+
+async def route(job: Job) -> bool:
+    """Replies follow their parent's thread, everything else is routed by content (LLM)."""
+    threads = get_thread_map()
+    # Known without a query: from the job row, the collector's announcement or a retry's backup row
+    parent_backup_id = (job.reply_backup_id or threads.announced_parent(job.source_chat_id, job.source_msg_id)
+                        or (job.existing_post.reply_id if job.existing_post else None)
+                        or job.message.reply_to_message_id)
+    parent = await threads.parent(parent_backup_id) if parent_backup_id else None
+
+    if parent:
+        job.destination = parent.destination
+        job.reply_to_id = parent.message_id
+        routing_stats["thread"] += 1
+        logging.info(f"Reply {job.source_chat_id}/{job.source_msg_id} follows its parent to {job.destination}")
+    else:
+        # Routing on the original runs next to the translation, see build_pipeline()
+        text = job.text if ROUTE_ON_TRANSLATION else job.original
+        job.destination = await get_destination(text, job.source_chat_id, get_cache())
+
+    if not job.destination:
+        logging.warning(f"No destination determined for message {job.source_chat_id}/{job.source_msg_id}")
+        return False
+    return True
+
+
+async def format_job(job: Job) -> bool:
+    footer = await get_cache().get_footer(job.destination)
+    job.formatted_text = await format_text(job.text, job.message, job.source, job.message.id, footer)
+    return True
+
+
+async def send(job: Job) -> bool:
+    """Posts through the destination's outbound queue, which paces sends and waits out FloodWaits."""
+    message = job.message
+
+    async def post():
+        if job.is_media_group:
+            msgs = await job.client.copy_media_group(
+                job.destination,
                 from_chat_id=CHANNEL_BACKUP,
                 message_id=message.id,
-                captions=formatted_text,
-                reply_to_message_id=reply_to_id
+                captions=job.formatted_text,
+                reply_to_message_id=job.reply_to_id
             )
-            new_msg = msgs[0]
-        else:
-            if message.text:
-                new_msg = await client.send_message(
-                    destination, 
-                    formatted_text, 
-                    reply_to_message_id=reply_to_id,
-                    disable_web_page_preview=True
-                )
-            else:
-                new_msg = await message.copy(
-                    destination, 
-                    caption=formatted_text,
-                    reply_to_message_id=reply_to_id
-                )
-            
-        # 10. Record in database
-        await set_post(Post(
-            destination=new_msg.chat.id,
-            message_id=new_msg.id,
-            source_channel_id=source_chat_id,
-            source_message_id=source_msg_id,
-            backup_id=message.id,
-            reply_id=reply_to_id,
-            message_text=formatted_text
-        ))
-        
-        elapsed = (time.perf_counter() - start_time) * 1000
-        logging.info(f"Processed and posted {source_chat_id}/{source_msg_id} to {destination} in {elapsed:.2f}ms")
-        
+            return msgs[0]
+        if message.text:
+            return await job.client.send_message(
+                job.destination,
+                job.formatted_text,
+                reply_to_message_id=job.reply_to_id,
+                disable_web_page_preview=True
+            )
+        return await message.copy(
+            job.destination,
+            caption=job.formatted_text,
+            reply_to_message_id=job.reply_to_id
+        )
+
+    try:
+        job.new_msg = await get_outbound().send(job.destination, post)
+        return True
+    except RPCError:
+        # Telegram rejected the send, so nothing was posted and the job fails to be retried
+        raise
     except Exception as e:
-        logging.error(f"Failed to post message to {destination}: {e}")
+        logging.error(f"Failed to post message to {job.destination}: {e}")
+        return False
+
+
+async def persist(job: Job) -> bool:
+    post = Post(
+        destination=job.new_msg.chat.id,
+        message_id=job.new_msg.id,
+        source_channel_id=job.source_chat_id,
+        source_message_id=job.source_msg_id,
+        backup_id=job.message.id,
+        reply_id=job.reply_to_id,
+        message_text=job.formatted_text
+    )
+    get_thread_map().add(post)
+    get_posted_index().add(job.source_chat_id, job.source_msg_id)
+    created_at = None
+    try:
+        created_at = await set_post(post)
+    except Exception as e:
+        # The message is out, failing the job would post it again. The posted index still knows it.
+        logging.error(f"Storing post {job.source_chat_id}/{job.source_msg_id} in {job.destination} failed: {e}")
+
+    # Keep the learned router up to date with the text route() classifies, as tools/train_router.py learns it
+    get_router().learn(job.text if ROUTE_ON_TRANSLATION else job.original, job.destination,
+                       created_at.isoformat() if created_at else None)
+
+    elapsed = (time.perf_counter() - job.started) * 1000
+    logging.info(f"Processed and posted {job.source_chat_id}/{job.source_msg_id} to {job.destination} in {elapsed:.2f}ms")
+    return True
 
-async def handle_backup_message(client: Client, message: Message, cache):
-    """Handles incoming messages from backup, including media group buffering."""
+
+def build_pipeline() -> Pipeline:
+    handlers = {"dedup": check_posted, "debloat": debloat, "translate": translate_job, "route": route,
+                "format": format_job, "send": send, "persist": persist}
+    pipeline = Pipeline([Stage(name, handlers[name], PIPELINE_WORKERS[name], PIPELINE_QUEUE_SIZE[name])
+                         for name in PIPELINE_STAGES])
+    pipeline.connect("dedup", "debloat")
+    if ROUTE_ON_TRANSLATION:
+        pipeline.connect("debloat", "translate").connect("translate", "route").connect("route", "format")
+    else:
+        # Routing only needs the source text, so it runs while the translation is in flight
+        pipeline.connect("debloat", "translate", "route").connect("translate", "format").connect("route", "format")
+    return pipeline.connect("format", "send").connect("send", "persist")
+
+
+_pipeline: Optional[Pipeline] = None
+
+
+def get_pipeline() -> Pipeline:
+    """Get or build the global processing pipeline."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = build_pipeline()
+    return _pipeline
+
+async def handle_backup_message(client: Client, message: Message, media_groups: MediaGroupAssembler):
+    """Hands incoming messages from backup to the pipeline, album parts once their group is complete.
+    Waits while the pipeline is full."""
     if message.media_group_id:
-        mg_id = message.media_group_id
-        async with media_group_locks[mg_id]:
-            media_groups[mg_id].append(message)
-            if len(media_groups[mg_id]) == 1:
-                await asyncio.sleep(2) 
-                group = sorted(media_groups[mg_id], key=lambda m: m.id)
-                await process_message_logic(client, group[0], cache, is_media_group=True)
-                del media_groups[mg_id]
+        media_groups.add(message)
     else:
-        await process_message_logic(client, message, cache, is_media_group=False)
+        await get_pipeline().submit(Job(client, message))
+
+async def maintenance(media_groups: MediaGroupAssembler, consumer: Optional[JobConsumer]):
+    """Periodically log runtime stats and evict expired cache entries."""
+    translation_cache = get_translation_cache()
+    while True:
+        await asyncio.sleep(STATS_INTERVAL)
+        try:
+            logging.info(f"Translation cache: {translation_cache.stats()}")
+            await get_scheduler().sync_usage()
+            logging.info(f"Translator: {get_scheduler().state()}")
+            logging.info(f"Languages per source: {get_language_stats().state()}")
+            logging.info(f"Routing: {dict(routing_stats)}, route cache: {get_route_cache().stats()}")
+            logging.info(f"Reply threads: {get_thread_map().stats()}, posted index: {get_posted_index().stats()}")
+            logging.info(f"Pipeline: {get_pipeline().state()}, media groups: {media_groups.stats()}")
+            logging.info(f"Outbound: {get_outbound().state()}")
+            if consumer is None:
+                await get_thread_map().listen()
+            else:
+                purged = await purge_jobs(JOB_RETENTION_DAYS, JOB_MAX_ATTEMPTS)
+                logging.info(f"Jobs: {consumer.state()}, purged: {purged}")
+            logging.info(f"Routing models: {get_model_registry().state()}, batches: {get_routing_batcher().stats()}")
+            await translation_cache.evict_expired()
+            await get_route_cache().evict_expired()
+            if reload_router():
+                logging.info("Router model file changed, reloaded it")
+            elif get_router().dirty:
+                await get_router().save_async()
+        except Exception as e:
+            logging.error(f"Maintenance failed: {e}")
 
 async def main():
     add_logging()
     cache = get_cache()
     await cache.warm_cache()
+    await get_scheduler().sync_usage()
+    try:
+        await get_posted_index().load()
+    except Exception as e:
+        logging.error(f"Loading the posted index failed, checking posts in the database instead: {e}")
     
     accounts = await get_accounts()
     if not accounts:
@@ -216,11 +326,25 @@ async def main():
         parse_mode=ParseMode.HTML,
     )
     
-    @app.on_message(filters.chat(CHANNEL_BACKUP) & filters.incoming)
-    async def on_backup_msg(client: Client, message: Message):
-        await handle_backup_message(client, message, cache)
+    async def submit_media_group(messages: List[Message]):
+        await get_pipeline().submit(Job(app, messages[0], is_media_group=True))
+
+    media_groups = MediaGroupAssembler(submit_media_group)
+    consumer = JobConsumer(app, get_pipeline()) if JOB_QUEUE else None
+
+    if consumer is None:
+        # Replies are announced by the collector, queued jobs carry them instead
+        await get_thread_map().listen()
+
+        @app.on_message(filters.chat(CHANNEL_BACKUP) & filters.incoming)
+        async def on_backup_msg(client: Client, message: Message):
+            await handle_backup_message(client, message, media_groups)
 
+    get_pipeline().start()
     await app.start()
+    if consumer is not None:
+        asyncio.create_task(consumer.run())
+    asyncio.create_task(maintenance(media_groups, consumer))
     logging.info("Processor started and idling...")
     await asyncio.Event().wait()
 
@@ -0,0 +1,112 @@
+"""
+Assembles albums from their individually arriving backup messages.
+A group is complete once no new part arrived for a short quiet period, when it reached Telegram's 10 items
+per album, or at the latest after a hard cap since its first part.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from pyrogram.types import Message
+
+from bot.config import MEDIA_GROUP_QUIET, MEDIA_GROUP_MAX_WAIT, MEDIA_GROUP_MAX_PENDING
+from bot.health import LatencyWindow
+from bot.lru import LRUCache
+
+# Telegram allows up to 10 items per album
+MAX_ALBUM_SIZE = 10
+# Completed group ids are remembered this long, so stragglers aren't taken for a new album
+COMPLETED_TTL = 600
+
+
+@dataclass
+class _Group:
+    first_at: float
+    messages: List[Message] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class MediaGroupAssembler:
+    """Debounces the parts of each media group and hands complete groups, sorted by id, to on_complete."""
+
+    def __init__(self, on_complete: Callable[[List[Message]], Awaitable[None]], quiet: float = MEDIA_GROUP_QUIET,
+                 max_wait: float = MEDIA_GROUP_MAX_WAIT, max_pending: int = MEDIA_GROUP_MAX_PENDING) -> None:
+        self.on_complete = on_complete
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+
+        # Insertion ordered, the first group is the oldest
+        self._groups: Dict[str, _Group] = {}
+        self._completed: LRUCache[bool] = LRUCache(max_pending * 4, COMPLETED_TTL)
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.latency = LatencyWindow()
+        self.reasons: Dict[str, int] = {"quiet": 0, "size": 0, "max_wait": 0, "evicted": 0}
+        self.late = 0
+
+    def add(self, message: Message) -> None:
+        group_id = message.media_group_id
+        if group_id in self._completed:
+            self.late += 1
+            logging.warning(f"Part {message.id} of media group {group_id} arrived after the group was processed")
+            return
+
+        loop = asyncio.get_running_loop()
+        group = self._groups.get(group_id)
+        if group is None:
+            if len(self._groups) >= self.max_pending:
+                self._complete(next(iter(self._groups)), "evicted")
+            group = self._groups[group_id] = _Group(first_at=loop.time())
+        group.messages.append(message)
+        self._schedule(group_id, group)
+
+    def _schedule(self, group_id: str, group: _Group) -> None:
+        if group.timer is not None:
+            group.timer.cancel()
+
+        if len(group.messages) >= MAX_ALBUM_SIZE:
+            self._complete(group_id, "size")
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = group.first_at + self.max_wait
+        if loop.time() + self.quiet < deadline:
+            group.timer = loop.call_later(self.quiet, self._complete, group_id, "quiet")
+        else:
+            group.timer = loop.call_at(deadline, self._complete, group_id, "max_wait")
+
+    def _complete(self, group_id: str, reason: str) -> None:
+        group = self._groups.pop(group_id, None)
+        if group is None:
+            return
+        if group.timer is not None:
+            group.timer.cancel()
+
+        elapsed = asyncio.get_running_loop().time() - group.first_at
+        self.latency.add(elapsed)
+        self.reasons[reason] += 1
+        self._completed.set(group_id, True)
+        logging.info(f"Media group {group_id} assembled with {len(group.messages)} parts in {elapsed * 1000:.0f}ms "
+                     f"({reason})")
+
+        task = asyncio.create_task(self.on_complete(sorted(group.messages, key=lambda m: m.id)))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.error(f"Handling an assembled media group failed: {task.exception()}", exc_info=task.exception())
+
+    def stats(self) -> Dict[str, object]:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        return {
+            "pending": len(self._groups),
+            "completed": dict(self.reasons),
+            "late_parts": self.late,
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
@@ -0,0 +1,117 @@
+"""
+Outbound send scheduler.
+Every destination channel has its own queue, worked off in order and paced by a token bucket to stay below
+Telegram's per-chat limits. A FloodWait suspends only the affected channel for the requested time, then the
+same send is retried. Telegram rejected it, so nothing was posted and the retry can't post twice. Other
+errors are not retried, since the post may have gone out.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from pyrogram.errors import FloodWait
+
+from bot.config import OUTBOUND_RATE_PER_MINUTE, OUTBOUND_BURST, OUTBOUND_MAX_RETRIES
+from bot.health import Ewma, TokenBucket
+
+T = TypeVar("T")
+
+
+class _ChatQueue:
+    """Queue, pacing and counters of one destination channel."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.queue: asyncio.Queue[Tuple[Callable[[], Awaitable[Any]], asyncio.Future, float]] = asyncio.Queue()
+        self.bucket = TokenBucket(rate, burst)
+        self.suspended_until = 0.0
+        self.worker: Optional[asyncio.Task] = None
+
+        self.sent = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.wait = Ewma()
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "flood_waits": self.flood_waits,
+            "suspended_for": round(max(0.0, self.suspended_until - time.monotonic()), 1),
+            "avg_wait_s": round(self.wait.value, 2) if self.wait.value is not None else None,
+        }
+
+
+class OutboundScheduler:
+    """Serializes and paces sends per destination channel."""
+
+    def __init__(self, rate_per_minute: float = OUTBOUND_RATE_PER_MINUTE, burst: float = OUTBOUND_BURST,
+                 max_retries: int = OUTBOUND_MAX_RETRIES) -> None:
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_retries = max_retries
+        self._chats: Dict[int, _ChatQueue] = {}
+
+    async def send(self, chat_id: int, call: Callable[[], Awaitable[T]]) -> T:
+        """Queue call for chat_id and wait for its result. call must make exactly one send."""
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatQueue(self.rate, self.burst)
+        if chat.worker is None or chat.worker.done():
+            chat.worker = asyncio.create_task(self._work(chat_id, chat))
+
+        future = asyncio.get_running_loop().create_future()
+        chat.queue.put_nowait((call, future, time.monotonic()))
+        return await future
+
+    async def _work(self, chat_id: int, chat: _ChatQueue) -> None:
+        while True:
+            call, future, queued_at = await chat.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                result = await self._attempt(chat_id, chat, call)
+                chat.wait.update(time.monotonic() - queued_at)
+                chat.sent += 1
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                chat.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                chat.queue.task_done()
+
+    async def _attempt(self, chat_id: int, chat: _ChatQueue, call: Callable[[], Awaitable[T]]) -> T:
+        for attempt in range(self.max_retries + 1):
+            while True:
+                delay = max(chat.suspended_until - time.monotonic(), chat.bucket.delay())
+                if delay <= 0 and chat.bucket.try_acquire():
+                    break
+                # Timers can fire a little early, check again rather than send without a token
+                await asyncio.sleep(max(delay, 0.001))
+
+            try:
+                return await call()
+            except FloodWait as e:
+                chat.flood_waits += 1
+                chat.suspended_until = time.monotonic() + e.value
+                logging.warning(f"FloodWait of {e.value}s for {chat_id}, attempt {attempt + 1}")
+                if attempt == self.max_retries:
+                    raise
+
+    def state(self) -> Dict[int, Dict[str, Any]]:
+        return {chat_id: chat.state() for chat_id, chat in self._chats.items()}
+
+
+# Global scheduler instance
+_scheduler: Optional[OutboundScheduler] = None
+
+
+def get_outbound() -> OutboundScheduler:
+    """Get or create the global outbound scheduler instance."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = OutboundScheduler()
+    return _scheduler
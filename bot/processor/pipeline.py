@@ -0,0 +1,164 @@
+"""
+Staged processing pipeline.
+Every stage has a bounded queue and a fixed number of workers. A worker only takes the next job after it has handed
+the current one to the following stages, so a slow stage fills its queue and then blocks the stages before it,
+down to the entry point, instead of piling up unbounded handler tasks.
+A stage can feed several stages that run in parallel, a stage with several inputs waits for all of them.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pyrogram import Client
+from pyrogram.types import Message
+
+from bot.health import Ewma
+from bot.model import Post
+
+
+@dataclass
+class Job:
+    """One backup message on its way through the pipeline, stages fill in their results."""
+    client: Client
+    message: Message
+    is_media_group: bool = False
+    started: float = field(default_factory=time.perf_counter)
+    source_chat_id: Optional[int] = None
+    source_msg_id: Optional[int] = None
+    existing_post: Optional[Post] = None
+    source: Any = None
+    original: Optional[str] = None
+    text: Optional[str] = None
+    destination: Optional[int] = None
+    reply_to_id: Optional[int] = None
+    formatted_text: Optional[str] = None
+    new_msg: Optional[Message] = None
+    # Delivery attempt of a queued job, later attempts may follow a crash after the post went out
+    attempt: int = 1
+    # Queued jobs carry the backup message they reply to from the collector, None if they aren't a reply
+    reply_backup_id: Optional[int] = None
+    # Set to "done", "dropped" or "failed" when the job leaves the pipeline, for callers that track it
+    outcome: Optional[asyncio.Future] = None
+    # Inputs that reached a joining stage so far
+    arrivals: Counter = field(default_factory=Counter)
+
+    def finish(self, outcome: str) -> None:
+        if self.outcome is not None and not self.outcome.done():
+            self.outcome.set_result(outcome)
+
+
+# A handler returns whether the job continues to the next stages
+Handler = Callable[[Job], Awaitable[bool]]
+
+
+class Stage:
+    """Bounded queue with its own workers."""
+
+    def __init__(self, name: str, handler: Handler, workers: int, queue_size: int) -> None:
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.next: List["Stage"] = []
+        self.inputs = 0
+        self._tasks: List[asyncio.Task] = []
+
+        self.busy = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.duration = Ewma()
+
+    async def put(self, job: Job) -> None:
+        """Queue job once all inputs delivered it, waits while the queue is full."""
+        if self.inputs > 1:
+            job.arrivals[self.name] += 1
+            if job.arrivals[self.name] < self.inputs:
+                return
+        await self.queue.put(job)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work(), name=f"{self.name}-{i}") for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.queue.get()
+            self.busy += 1
+            start = time.perf_counter()
+            try:
+                proceed = await self.handler(job)
+            except Exception as e:
+                logging.error(f"Stage {self.name} failed for backup message {job.message.id}: {e}", exc_info=True)
+                self.failed += 1
+                proceed = None
+            finally:
+                self.busy -= 1
+                self.duration.update(time.perf_counter() - start)
+
+            if proceed:
+                self.processed += 1
+                for stage in self.next:
+                    await stage.put(job)
+                if not self.next:
+                    job.finish("done")
+            elif proceed is None:
+                job.finish("failed")
+            else:
+                self.dropped += 1
+                job.finish("dropped")
+            # Only done once handed on, so join() doesn't miss jobs between stages
+            self.queue.task_done()
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "busy": self.busy,
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "avg_ms": round(self.duration.value * 1000, 1) if self.duration.value is not None else None,
+        }
+
+
+class Pipeline:
+    """Stages wired into a graph, listed in flow order. Jobs enter at the first stage."""
+
+    def __init__(self, stages: List[Stage]) -> None:
+        self.stages = {stage.name: stage for stage in stages}
+        self.entry = stages[0]
+
+    def connect(self, source: str, *targets: str) -> "Pipeline":
+        for target in targets:
+            self.stages[source].next.append(self.stages[target])
+            self.stages[target].inputs += 1
+        return self
+
+    def start(self) -> None:
+        for stage in self.stages.values():
+            stage.start()
+
+    async def stop(self) -> None:
+        for stage in self.stages.values():
+            await stage.stop()
+
+    async def submit(self, job: Job) -> None:
+        """Queue a job, waits while the first stage is full."""
+        await self.entry.put(job)
+
+    async def join(self) -> None:
+        """Wait until every queued job passed all stages."""
+        for stage in self.stages.values():
+            await stage.queue.join()
+
+    def state(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stage.state() for name, stage in self.stages.items()}
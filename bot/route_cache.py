@@ -0,0 +1,113 @@
+"""
+Memo for LLM routing decisions.
+Re-forwarded or reposted texts are classified once. Keys combine a normalized fingerprint of the text with
+the destination set version, so adding or renaming a destination invalidates all earlier decisions.
+"""
+import hashlib
+import logging
+from typing import Dict, Optional
+
+import regex as re
+
+from bot.config import ROUTE_CACHE_SIZE, ROUTE_CACHE_TTL, ROUTE_CACHE_PERSIST, ROUTE_CACHE_MIN_CONFIDENCE
+from bot.db import get_route, set_route, delete_expired_routes
+from bot.lru import LRUCache
+from bot.model import RouteDecision
+
+# Markup, links and everything that is not a letter or digit don't change where a post belongs
+PATTERN_NOISE = re.compile(r"<[^>]+>|https?://\S+|t\.me/\S+|[^\p{L}\p{N}]+")
+
+
+def fingerprint(text: str) -> str:
+    """Lowercased letters and digits of the text, separated by single spaces."""
+    return " ".join(PATTERN_NOISE.sub(" ", text).lower().split())
+
+
+def make_key(text: str, version: str) -> str:
+    payload = f"{version}\x00{fingerprint(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RouteCache:
+    """LRU + persistent store of routing decisions with their confidence."""
+
+    def __init__(self, maxsize: int = ROUTE_CACHE_SIZE, ttl: int = ROUTE_CACHE_TTL,
+                 persist: bool = ROUTE_CACHE_PERSIST, min_confidence: float = ROUTE_CACHE_MIN_CONFIDENCE) -> None:
+        self.ttl = ttl
+        self.persist = persist
+        self.min_confidence = min_confidence
+        self._memory: LRUCache[RouteDecision] = LRUCache(maxsize, ttl)
+
+        # Counters for monitoring
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    async def get(self, text: str, version: str) -> Optional[RouteDecision]:
+        """Stored decision for text, None if unknown or not confident enough to reuse."""
+        key = make_key(text, version)
+
+        decision = self._memory.get(key)
+        if decision is not None:
+            self.memory_hits += 1
+            return decision
+
+        if self.persist:
+            try:
+                decision = await get_route(key, self.ttl)
+            except Exception as e:
+                logging.warning(f"Route store lookup failed: {e}")
+
+        if decision is not None and decision.confidence >= self.min_confidence:
+            self.store_hits += 1
+            self._memory.set(key, decision)
+            return decision
+
+        self.misses += 1
+        return None
+
+    async def set(self, text: str, version: str, decision: RouteDecision) -> None:
+        if decision.confidence < self.min_confidence:
+            self.skipped += 1
+            return
+
+        key = make_key(text, version)
+        self._memory.set(key, decision)
+        if self.persist:
+            try:
+                await set_route(key, decision)
+            except Exception as e:
+                logging.warning(f"Route store write failed: {e}")
+
+    async def evict_expired(self) -> None:
+        """Drop expired entries from memory and the persistent store."""
+        evicted = self._memory.evict_expired()
+        if self.persist:
+            try:
+                status = await delete_expired_routes(self.ttl)
+                logging.info(f"Route cache eviction: {evicted} in memory, store: {status}")
+            except Exception as e:
+                logging.warning(f"Route store eviction failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._memory),
+            "hits": self.memory_hits + self.store_hits,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "skipped_low_confidence": self.skipped,
+        }
+
+
+# Global cache instance
+_route_cache: Optional[RouteCache] = None
+
+
+def get_route_cache() -> RouteCache:
+    """Get or create the global route cache instance."""
+    global _route_cache
+    if _route_cache is None:
+        _route_cache = RouteCache()
+    return _route_cache
@@ -0,0 +1,96 @@
+"""
+Thread affinity for replies.
+A reply goes to the channel its parent was spread to, as a reply to the parent's post there, without routing.
+The backup message id identifies a (source chat, message) pair, recent ones are mapped to their destination
+post in memory, older ones are looked up in the posts table.
+Forwards to backup don't say whether they are replies. Queued jobs carry the parent from the collector's job row,
+otherwise the collector announces replies with a NOTIFY before it forwards them. Only announced replies cost
+a lookup, other posts none. Announcements missed while the processor was disconnected are routed by content.
+"""
+import logging
+from typing import Dict, Optional
+
+from asyncpg import Connection
+
+from bot.config import CHANNEL_BACKUP, THREAD_MAP_SIZE
+from bot.db import get_destination_post, listen_replies
+from bot.lru import LRUCache
+from bot.model import Post
+from bot.posted_index import pack
+
+
+class ThreadMap:
+    """Backup message id -> post in the destination channel."""
+
+    def __init__(self, maxsize: int = THREAD_MAP_SIZE) -> None:
+        self._posts: LRUCache[Post] = LRUCache(maxsize)
+        # Packed source key of an announced reply -> backup id of its parent
+        self._replies: LRUCache[int] = LRUCache(maxsize)
+        self._listener: Optional[Connection] = None
+
+        # Counters for monitoring
+        self.announced = 0
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def add(self, post: Post) -> None:
+        self._posts.set(post.backup_id, post)
+
+    async def parent(self, backup_id: int) -> Optional[Post]:
+        """Destination post of the backup message replied to, None if it wasn't spread."""
+        post = self._posts.get(backup_id)
+        if post is not None:
+            self.memory_hits += 1
+            return post
+
+        try:
+            post = await get_destination_post(backup_id, CHANNEL_BACKUP)
+        except Exception as e:
+            logging.warning(f"Parent lookup for backup message {backup_id} failed: {e}")
+
+        if post is None:
+            self.misses += 1
+            return None
+
+        self.store_hits += 1
+        self._posts.set(backup_id, post)
+        return post
+
+    def announce(self, channel_id: int, message_id: int, parent_backup_id: int) -> None:
+        self.announced += 1
+        self._replies.set(pack(channel_id, message_id), parent_backup_id)
+
+    def announced_parent(self, channel_id: int, message_id: int) -> Optional[int]:
+        """Backup id of the parent of an announced reply, None for everything else."""
+        return self._replies.pop(pack(channel_id, message_id))
+
+    async def listen(self) -> None:
+        """Receive the collector's reply announcements, reconnects if the connection was lost."""
+        if self._listener is not None and not self._listener.is_closed():
+            return
+        try:
+            self._listener = await listen_replies(self.announce)
+        except Exception as e:
+            logging.warning(f"Listening for reply announcements failed, replies are routed by content: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._posts),
+            "announced": self.announced,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+        }
+
+
+# Global map instance
+_thread_map: Optional[ThreadMap] = None
+
+
+def get_thread_map() -> ThreadMap:
+    """Get or create the global thread map instance."""
+    global _thread_map
+    if _thread_map is None:
+        _thread_map = ThreadMap()
+    return _thread_map
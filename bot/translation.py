@@ -1,24 +1,20 @@
 import logging
+from typing import Iterator, List, Optional, Tuple
 
-import deepl
 import regex as re
-from deep_translator import GoogleTranslator
-from deepl import QuotaExceededException, SplitSentences
 from pyrogram import Client
 from pyrogram.enums import ParseMode
 from pyrogram.types import Message
 
-from config import DEEPL, GROUP_PATTERN
-from constant import (PLACEHOLDER, PATTERN_REPLACEMENT, PATTERN_HTMLTAG, PATTERN_HASHTAG, emoji_space_pattern,
-                      emoji_pattern, PATTERN_FITZPATRICK, REPLACEMENTS, PATTERN_PARAGRAPH)
+from config import GROUP_PATTERN, LANGUAGE_SKIP_CONFIDENCE
+from constant import (PLACEHOLDER, PATTERN_PLACEHOLDER, LEGACY_PLACEHOLDER, PATTERN_REPLACEMENT, PATTERN_HTMLTAG, PATTERN_HASHTAG, emoji_space_pattern,
+                      emoji_pattern, PATTERN_FITZPATRICK, REPLACEMENTS, PATTERN_SENTENCE_END,
+                      PATTERN_DIGIT, SENTENCE_MIN_NON_DIGITS, PATTERN_INVITE, PATTERN_PARTIAL_TAG)
 from model import SourceDisplay
-
-translator = None
-if DEEPL:
-    try:
-        translator = deepl.Translator(DEEPL)
-    except Exception as e:
-        logging.error(f"Failed to initialize DeepL: {e}")
+from bot.language import get_detector, get_language_stats
+from bot.matcher import PatternMatcher
+from bot.translator import translate_text
+from bot.translation_cache import get_translation_cache
 
 BLACKLIST = [
     "Нічний чат, правила стандартні:",
@@ -26,11 +22,17 @@ BLACKLIST = [
     "patreon"
 ]
 
-BLACKLIST = re.compile(f"({')|('.join(BLACKLIST)})", re.IGNORECASE)
+BLACKLIST = PatternMatcher(BLACKLIST)
 
 ABBREVIATIONS = {
     "AFU": "ukrainian Armed forces"
 }
+# Single matcher for all abbreviations, looked up case-insensitively
+ABBREVIATIONS = {k.lower(): v for k, v in ABBREVIATIONS.items()}
+PATTERN_ABBREVIATION = re.compile(rf"\b(?:{'|'.join(map(re.escape, ABBREVIATIONS))})\b", re.IGNORECASE)
+
+# Language posts are translated into
+TARGET_LANG = "de"
 
 # Telegram caption limit - use conservative estimate for safety
 TELEGRAM_CAPTION_LIMIT = 1024
@@ -42,18 +44,93 @@ def escape(string: str) -> str:
     return re.escape(string)
 
 
+def protect_tokens(text: str) -> Tuple[str, List[str]]:
+    """Replace emojis and links with short indexed tags, so they are neither translated nor billed."""
+    tokens: List[str] = []
+
+    def replace(m) -> str:
+        tokens.append(m.group(0))
+        return PLACEHOLDER.format(len(tokens) - 1)
+
+    return emoji_pattern.sub(replace, text), tokens
+
+
+def restore_tokens(text: str, tokens: List[str]) -> str:
+    """
+    Put protected tokens back in a single pass by index.
+    Reordered tags still get their own token, duplicated ones are dropped and unbalanced links are closed.
+    """
+    used = [False] * len(tokens)
+    open_links = 0
+
+    def replace(m) -> str:
+        nonlocal open_links
+        i = int(m.group(1))
+        if i >= len(tokens) or used[i]:
+            return ""
+        used[i] = True
+
+        token = tokens[i]
+        if token.startswith("</"):
+            if open_links == 0:
+                return ""
+            open_links -= 1
+        elif token.startswith("<"):
+            open_links += 1
+        return token
+
+    text = PATTERN_PLACEHOLDER.sub(replace, text)
+    if open_links:
+        text += "</a>" * open_links
+
+    dropped = used.count(False)
+    if dropped:
+        logging.warning(f"{dropped} of {len(tokens)} placeholders were dropped during translation")
+
+    return text
+
+
+def placeholder_savings(tokens: List[str]) -> int:
+    """Billed characters saved compared to the former verbose placeholder."""
+    return sum(len(LEGACY_PLACEHOLDER) - len(PLACEHOLDER.format(i)) for i in range(len(tokens)))
+
+
+def iter_sentences(text: str) -> Iterator[str]:
+    """
+    Split text at whitespace following .!? when the 20 characters before the punctuation contain no digit.
+    Single forward scan with a bounded look back per candidate, so cost stays linear in the text length.
+    """
+    start = 0
+    for m in PATTERN_SENTENCE_END.finditer(text):
+        end = m.start()
+        if end >= SENTENCE_MIN_NON_DIGITS and PATTERN_DIGIT.search(text, end - SENTENCE_MIN_NON_DIGITS, end) is None:
+            yield text[start:end + 1]
+            start = m.end()
+    yield text[start:]
+
+
+def iter_paragraphs(text: str, threshold: int = 440) -> Iterator[str]:
+    """Merge consecutive sentences into paragraphs shorter than threshold, yielding each one when complete."""
+    parts: List[str] = []
+    length = 0
+    for sentence in iter_sentences(text):
+        if parts and len(sentence) + length < threshold:
+            parts.append(sentence)
+            length += len(sentence) + 1
+        else:
+            if parts:
+                yield " ".join(parts)
+            parts = [sentence]
+            length = len(sentence)
+    if parts:
+        yield " ".join(parts)
+
+
 def chunk_paragraphs(text: str) -> str:
-    if len(text) <= 1200 and len(re.findall(f'\n\n', text)) < 5:
+    if len(text) <= 1200 and text.count('\n\n') < 5:
         return text
 
-    res = []
-    threshold = 440
-    for chunk in re.split(PATTERN_PARAGRAPH, text):
-        if res and len(chunk) + len(res[-1]) < threshold:
-            res[-1] += f' {chunk}'
-        else:
-            res.append(f'{chunk}')
-    return "\n\n".join(res)
+    return "\n\n".join(iter_paragraphs(text))
 
 
 def truncate_text(text: str, max_length: int) -> str:
@@ -79,36 +156,44 @@ def truncate_text(text: str, max_length: int) -> str:
     if last_end > max_length * 0.6:
         truncated = truncated[:last_end + 1]
 
+    # Don't leave half a tag or an unclosed link behind
+    truncated = PATTERN_PARTIAL_TAG.sub("", truncated)
+    truncated += "</a>" * (truncated.count("<a ") - truncated.count("</a>"))
+
     return truncated.rstrip() + " ..."
 
 
-def translate(text: str, is_caption: bool = False) -> str:
+async def translate(text: str, is_caption: bool = False, source_lang: Optional[str] = None,
+                    tokens: Optional[List[str]] = None) -> str:
     """
     Translate text. If is_caption=True, pre-truncate to avoid translating excess text.
+    Results are memoized, so copies of the same post are only billed once.
+    Text already in the target language only gets the length handling and is not sent to a backend.
+    Tokens protected by protect_tokens() are restored before paragraphs are chunked and the length is checked.
     """
+    if source_lang == TARGET_LANG:
+        logging.info("Text already in target language, skipping translation")
+        translated_text = _prepare(text, is_caption)
+    else:
+        # Cached with the tags, the same tags stand for other tokens in other messages
+        translated_text = await get_translation_cache().get_or_translate(text, TARGET_LANG, is_caption,
+                                                                         lambda: _translate(text, is_caption))
+
+    if tokens is not None:
+        translated_text = restore_tokens(translated_text, tokens)
+    return _finish(translated_text, is_caption)
+
+
+def _prepare(text: str, is_caption: bool) -> str:
     # Pre-truncate long captions before translation to save API calls
     if is_caption and len(text) > TELEGRAM_CAPTION_LIMIT - FOOTER_RESERVE:
         logging.info(
             f"Pre-truncating caption before translation: {len(text)} -> {TELEGRAM_CAPTION_LIMIT - FOOTER_RESERVE}")
         text = truncate_text(text, TELEGRAM_CAPTION_LIMIT - FOOTER_RESERVE)
+    return text
 
-    try:
-        if translator:
-            translated_text = translator.translate_text(text,
-                                                        target_lang="de",
-                                                        split_sentences=SplitSentences.ALL,
-                                                        tag_handling="html",
-                                                        ).text
-        else:
-            raise Exception("DeepL translator not initialized")
-
-    except QuotaExceededException:
-        logging.info("--- Quota exceeded ---")
-        translated_text = GoogleTranslator(source='auto', target="de").translate(text=text)
-    except Exception as e:
-        logging.error(f"--- other error translating --- {e}")
-        translated_text = GoogleTranslator(source='auto', target="de").translate(text=text)
 
+def _finish(translated_text: str, is_caption: bool) -> str:
     translated_text = chunk_paragraphs(translated_text)
 
     # Post-translation safety check for captions
@@ -121,6 +206,13 @@ def translate(text: str, is_caption: bool = False) -> str:
     return translated_text
 
 
+async def _translate(text: str, is_caption: bool) -> str:
+    text = _prepare(text, is_caption)
+
+    # Runs without blocking the event loop, other updates keep being served meanwhile
+    return await translate_text(text, target_lang=TARGET_LANG)
+
+
 from bot.db_cache import DBCache
 
 
@@ -159,28 +251,24 @@ async def debloat_message(message: Message, client: Client, cache: DBCache) -> b
         # No text or caption (e.g. just a photo without caption)
         return False
 
-    if len(re.findall(BLACKLIST, text)) != 0:
+    if BLACKLIST.search(text):
         return False
 
     # Identify the original source chat ID for pattern matching
     source_chat_id = message.forward_from_chat.id if message.forward_from_chat else message.chat.id
     source_username = message.forward_from_chat.username if message.forward_from_chat else message.chat.username
 
-    # Use cached patterns instead of direct db call
-    patterns = await cache.get_patterns(source_chat_id)
+    # Use the cached, precompiled program instead of building regexes per message
+    program = await cache.get_debloat_program(source_chat_id, source_username)
 
     text = PATTERN_HTMLTAG.sub("", text).rstrip()
 
-    if patterns is not None and len(patterns) != 0:
-        pat = [escape(re.sub(PATTERN_HTMLTAG, '', p)) for p in patterns]
-        pattern = fr"({')|('.join(pat)})"
-
-        result = re.findall(pattern, text, flags=re.IGNORECASE)
+    if program.bloat is not None:
+        debloated, count = program.bloat.remove(text)
         logging.info(f"Text ::: {text}")
-        logging.info(f"clean_pattern__result ::: {result}")
-        logging.info(pattern)
+        logging.info(f"clean_pattern__result ::: {count}")
 
-        if len(result) == 0:
+        if count == 0:
             # If it's already in backup, forwarding again might be redundant but okay for logging
             await message.forward(GROUP_PATTERN)
             await client.send_message(GROUP_PATTERN, text, parse_mode=ParseMode.DISABLED)
@@ -188,14 +276,14 @@ async def debloat_message(message: Message, client: Client, cache: DBCache) -> b
             logging.info(f"-- doesnt match --\n\n{text}\n\n---")
             return False
 
-        text = re.sub(pattern, "", text)
+        text = debloated
 
-    if source_username:
-        text = re.sub(f"@{source_username}$", "", text, flags=re.IGNORECASE).rstrip()
+    if program.username_suffix is not None:
+        text = program.username_suffix.sub("", text).rstrip()
     text = PATTERN_HASHTAG.sub("", text, ).rstrip()
     logging.info(f"<<<<< hashtag :  {text}")
 
-    if len(re.findall(r"t\.me/\+", text)) != 0:
+    if PATTERN_INVITE.search(text) is not None:
         logging.info(f">>>>>>>>> likely contains ad, please check! -- {message.link}")
         await client.send_message(GROUP_PATTERN, f">>>>>>>>> likely contains ad, please check! -- {message.link}",
                                   parse_mode=ParseMode.DISABLED)
@@ -208,6 +296,21 @@ async def debloat_message(message: Message, client: Client, cache: DBCache) -> b
     return text
 
 
+async def detect_language(text: str, source_id: int, cache: DBCache) -> Optional[str]:
+    """
+    Language of a post, None if unsure. A language pinned on the source wins over detection.
+    """
+    source = await cache.get_source(source_id)
+    if source is not None and source.language:
+        return source.language
+
+    lang, confidence = get_detector().detect(text)
+    get_language_stats().record(source_id, lang, TARGET_LANG)
+    logging.info(f"Detected language {lang} ({confidence:.2f}) for source {source_id}")
+
+    return lang if confidence >= LANGUAGE_SKIP_CONFIDENCE else None
+
+
 async def debloat_text(message: Message, client: Client, cache: DBCache, is_caption: bool = False) -> bool | str:
     """
     Process and translate text. Pass is_caption=True to enable length limits.
@@ -217,30 +320,35 @@ async def debloat_text(message: Message, client: Client, cache: DBCache, is_capt
     if not text:
         return False
 
+    source_chat_id = message.forward_from_chat.id if message.forward_from_chat else message.chat.id
+    return await translate_debloated(text, source_chat_id, cache, is_caption)
+
+
+async def translate_debloated(text: str, source_chat_id: int, cache: DBCache, is_caption: bool = False) -> str:
+    """
+    Translate the output of debloat_message, keeping emojis and links intact.
+    Split from debloat_text so callers can work with the debloated original while this runs.
+    """
     logging.info(f"clean_pattern  {text}")
 
+    source_lang = await detect_language(text, source_chat_id, cache)
+
     text = re.sub(emoji_space_pattern, r"\1 \2", text)
     logging.info(f"<<<<< spaced  {text}")
 
-    emojis = emoji_pattern.findall(text)
-    logging.info(f">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>> emoijis: {emojis}")
-    text = emoji_pattern.sub(PLACEHOLDER, text).rstrip()
+    text, tokens = protect_tokens(text)
+    text = text.rstrip()
     logging.info(f">>>>>>>>>> placeholder  {text}")
+    logging.info(f"Protected {len(tokens)} tokens, {placeholder_savings(tokens)} chars saved")
 
     text = PATTERN_REPLACEMENT.sub(lambda m: REPLACEMENTS[re.escape(m.group(0))], text)
 
     logging.info(f"<<<<< spaced_BEFORE::: {text}", )
 
-    for abbreviation, meaning in ABBREVIATIONS.items():
-        text = re.sub(r'\b' + re.escape(abbreviation) + r'\b', meaning, text, flags=re.IGNORECASE)
+    text = PATTERN_ABBREVIATION.sub(lambda m: ABBREVIATIONS[m.group(0).lower()], text)
 
     # Translate with caption awareness - truncates before translation if needed
-    text = translate(text, is_caption=is_caption)
-
-    logging.info(f"--------------------------------------------------------\n\n------ TRANS -single {text, emojis}", )
-
-    for emoji in emojis:
-        text = re.sub(PLACEHOLDER, emoji, text, 1)
+    text = await translate(text, is_caption=is_caption, source_lang=source_lang, tokens=tokens)
 
     logging.info(f"-------------------------\n>>>>>>>> translated_text:\n {text}")
 
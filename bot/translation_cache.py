@@ -0,0 +1,139 @@
+"""
+Content-addressed memo layer in front of translate().
+Identical texts reaching us through several sources are translated and billed only once.
+Lookups go memory LRU -> in-flight requests -> translations table -> backend.
+"""
+import asyncio
+import hashlib
+import logging
+import unicodedata
+from typing import Awaitable, Callable, Dict, Optional
+
+import regex as re
+
+from bot.config import TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL, TRANSLATION_CACHE_PERSIST
+from bot.db import get_translation, set_translation, delete_expired_translations
+from bot.lru import LRUCache
+
+PATTERN_HSPACE = re.compile(r"[^\S\n]+")
+
+
+def normalize(text: str) -> str:
+    """Normalize text so trivially different copies of a post share one cache entry."""
+    text = unicodedata.normalize("NFC", text)
+    lines = (PATTERN_HSPACE.sub(" ", line).strip() for line in text.split("\n"))
+    return "\n".join(lines).strip()
+
+
+def make_key(text: str, target_lang: str, is_caption: bool) -> str:
+    """Hash of normalized pre-translation text, target language and caption mode."""
+    payload = f"{target_lang.lower()}\x00{int(is_caption)}\x00{normalize(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """LRU + persistent translation memo with single-flight request coalescing."""
+
+    def __init__(self, maxsize: int = TRANSLATION_CACHE_SIZE, ttl: int = TRANSLATION_CACHE_TTL,
+                 persist: bool = TRANSLATION_CACHE_PERSIST) -> None:
+        self.ttl = ttl
+        self.persist = persist
+        self._memory: LRUCache[str] = LRUCache(maxsize, ttl)
+        # Lookups run as their own tasks, so a cancelled caller doesn't cancel the others waiting for them
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        # Counters for monitoring
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.saved_chars = 0
+        self.billed_chars = 0
+
+    async def _load(self, key: str) -> Optional[str]:
+        if not self.persist:
+            return None
+        try:
+            return await get_translation(key, self.ttl)
+        except Exception as e:
+            logging.warning(f"Translation store lookup failed: {e}")
+            return None
+
+    async def _store(self, key: str, value: str) -> None:
+        if not self.persist:
+            return
+        try:
+            await set_translation(key, value)
+        except Exception as e:
+            logging.warning(f"Translation store write failed: {e}")
+
+    async def get_or_translate(self, text: str, target_lang: str, is_caption: bool,
+                               factory: Callable[[], Awaitable[str]]) -> str:
+        """Return cached translation or run factory once, sharing the result with concurrent callers."""
+        key = make_key(text, target_lang, is_caption)
+
+        value = self._memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            self.saved_chars += len(text)
+            return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            self.saved_chars += len(text)
+        else:
+            task = asyncio.create_task(self._fetch(key, text, factory))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Failures reach every caller and aren't cached, the next call tries again
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, text: str, factory: Callable[[], Awaitable[str]]) -> str:
+        value = await self._load(key)
+        if value is not None:
+            self.store_hits += 1
+            self.saved_chars += len(text)
+        else:
+            self.misses += 1
+            self.billed_chars += len(text)
+            value = await factory()
+            await self._store(key, value)
+
+        self._memory.set(key, value)
+        return value
+
+    async def evict_expired(self) -> None:
+        """Drop expired entries from memory and the persistent store."""
+        evicted = self._memory.evict_expired()
+        if self.persist:
+            try:
+                status = await delete_expired_translations(self.ttl)
+                logging.info(f"Translation cache eviction: {evicted} in memory, store: {status}")
+            except Exception as e:
+                logging.warning(f"Translation store eviction failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        hits = self.memory_hits + self.store_hits + self.coalesced
+        return {
+            "size": len(self._memory),
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "saved_chars": self.saved_chars,
+            "billed_chars": self.billed_chars,
+        }
+
+
+# Global cache instance
+_translation_cache: Optional[TranslationCache] = None
+
+
+def get_translation_cache() -> TranslationCache:
+    """Get or create the global translation cache instance."""
+    global _translation_cache
+    if _translation_cache is None:
+        _translation_cache = TranslationCache()
+    return _translation_cache
@@ -0,0 +1,402 @@
+"""
+Non-blocking translation backends for DeepL and Google.
+DeepL is called through a pooled AsyncClient, Google has no async path and runs on a bounded thread pool.
+Concurrent DeepL requests are coalesced into micro-batches, one HTTP round trip per batch.
+A scheduler tracks DeepL quota and backend health and routes each text to the best available backend.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from deep_translator import GoogleTranslator as _GoogleTranslator
+from httpx import AsyncClient, Limits, HTTPStatusError
+
+from bot.config import (DEEPL, TRANSLATION_CONCURRENCY, TRANSLATION_WORKERS, TRANSLATION_BATCH_WINDOW,
+                        TRANSLATION_BATCH_SIZE, TRANSLATION_BATCH_CHARS, TRANSLATION_HEDGE_PERCENTILE,
+                        TRANSLATION_HEDGE_MIN_DELAY, TRANSLATION_BREAKER_FAILURES, TRANSLATION_BREAKER_RESET)
+from bot.health import BackendHealth, LatencyWindow
+
+# Free-tier keys end with ":fx" and are served from a separate host
+DEEPL_URL = "https://api-free.deepl.com/v2" if DEEPL and DEEPL.endswith(":fx") else "https://api.deepl.com/v2"
+
+# DeepL answers with 456 once the character quota is used up
+STATUS_QUOTA_EXCEEDED = 456
+
+# Shared pool for blocking SDK calls, sized independently of pyrogram's workers
+_executor = ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix="translate")
+
+
+class QuotaExceededError(Exception):
+    """Raised when the DeepL character quota is exhausted."""
+
+
+class DeepLTranslator:
+    """DeepL REST client with connection pooling and a concurrency cap."""
+    name = "deepl"
+
+    def __init__(self, auth_key: str, concurrency: int = TRANSLATION_CONCURRENCY) -> None:
+        self._client = AsyncClient(
+            base_url=DEEPL_URL,
+            headers={"Authorization": f"DeepL-Auth-Key {auth_key}"},
+            timeout=20.0,
+            limits=Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+                keepalive_expiry=30.0
+            )
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def translate(self, texts: List[str], target_lang: str) -> List[str]:
+        """Translate all texts in a single request, preserving order."""
+        async with self._semaphore:
+            response = await self._client.post(
+                "/translate",
+                json={
+                    "text": texts,
+                    "target_lang": target_lang.upper(),
+                    "split_sentences": "1",
+                    "tag_handling": "html"
+                }
+            )
+        if response.status_code == STATUS_QUOTA_EXCEEDED:
+            raise QuotaExceededError()
+        response.raise_for_status()
+        return [t["text"] for t in response.json()["translations"]]
+
+    async def get_usage(self) -> Tuple[int, int]:
+        """Billed characters and character limit of the current period."""
+        response = await self._client.get("/usage")
+        response.raise_for_status()
+        usage = response.json()
+        return usage["character_count"], usage["character_limit"]
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class GoogleTranslator:
+    """deep_translator's Google backend, run on the bounded executor."""
+    name = "google"
+
+    def __init__(self, concurrency: int = TRANSLATION_CONCURRENCY) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @staticmethod
+    def _translate(text: str, target_lang: str) -> str:
+        # A new SDK object per call, translate() keeps the text in instance state and isn't thread-safe
+        return _GoogleTranslator(source='auto', target=target_lang).translate(text)
+
+    async def translate(self, texts: List[str], target_lang: str) -> List[str]:
+        """Translate texts one by one without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+
+        async def run(text: str) -> str:
+            async with self._semaphore:
+                return await loop.run_in_executor(_executor, self._translate, text, target_lang)
+
+        return list(await asyncio.gather(*(run(t) for t in texts)))
+
+
+class DeepLUsage:
+    """Character usage against the DeepL limit, synced from the API and counted locally in between."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.limit: Optional[int] = None
+        self.synced_at: Optional[float] = None
+        # Set by a quota error, the next sync tells whether the quota was renewed
+        self.exhausted = False
+
+    def has_quota(self, chars: int) -> bool:
+        if self.exhausted:
+            return False
+        return self.limit is None or self.count + chars <= self.limit
+
+    def add(self, chars: int) -> None:
+        self.count += chars
+
+    def exhaust(self) -> None:
+        if self.limit is not None:
+            self.count = self.limit
+        self.exhausted = True
+
+    def sync(self, count: int, limit: int) -> None:
+        self.count = count
+        self.limit = limit
+        self.exhausted = False
+        self.synced_at = time.monotonic()
+
+    def state(self) -> Dict[str, Any]:
+        return {"count": self.count, "limit": self.limit, "exhausted": self.exhausted}
+
+
+class TrackedBackend:
+    """Records latency, failures and (for DeepL) billed characters of every call to a backend."""
+
+    def __init__(self, backend: Any, health: BackendHealth, usage: Optional[DeepLUsage] = None) -> None:
+        self.backend = backend
+        self.health = health
+        self.usage = usage
+        self.name = health.name
+
+    async def translate(self, texts: List[str], target_lang: str) -> List[str]:
+        start = time.perf_counter()
+        try:
+            result = await self.backend.translate(texts, target_lang)
+        except QuotaExceededError:
+            # Not a health problem, the scheduler stops routing here until usage is synced again.
+            # A half-open trial is given back, the breaker would stay claimed once the quota is renewed.
+            self.health.breaker.release()
+            if self.usage is not None:
+                self.usage.exhaust()
+            raise
+        except asyncio.CancelledError:
+            self.health.breaker.release()
+            raise
+        except Exception:
+            self.health.record_failure()
+            raise
+
+        self.health.record_success(time.perf_counter() - start)
+        if self.usage is not None:
+            self.usage.add(sum(len(t) for t in texts))
+        return result
+
+
+class DeepLBatcher:
+    """
+    Collects pending translations for a short window, or until a size or character budget is reached,
+    sends them as one DeepL request and fans the results back to the waiting callers.
+    Falls back to per-item Google translation if the batch fails.
+    """
+
+    def __init__(self, backend: TrackedBackend, fallback: TrackedBackend,
+                 window: float = TRANSLATION_BATCH_WINDOW, max_items: int = TRANSLATION_BATCH_SIZE,
+                 max_chars: int = TRANSLATION_BATCH_CHARS) -> None:
+        self.backend = backend
+        self.fallback = fallback
+        self.window = window
+        self.max_items = max_items
+        self.max_chars = max_chars
+
+        # Pending jobs per target language
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = defaultdict(list)
+        self._pending_chars: Dict[str, int] = defaultdict(int)
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.batched_texts = 0
+        self.failed_batches = 0
+
+    async def translate(self, text: str, target_lang: str) -> str:
+        """Queue text for the next batch and wait for its translation."""
+        loop = asyncio.get_running_loop()
+
+        # Keep each request within the character budget
+        if self._pending[target_lang] and self._pending_chars[target_lang] + len(text) > self.max_chars:
+            self._flush(target_lang)
+
+        future = loop.create_future()
+        self._pending[target_lang].append((text, future))
+        self._pending_chars[target_lang] += len(text)
+
+        if len(self._pending[target_lang]) >= self.max_items or self._pending_chars[target_lang] >= self.max_chars:
+            self._flush(target_lang)
+        elif target_lang not in self._timers:
+            self._timers[target_lang] = loop.call_later(self.window, self._flush, target_lang)
+
+        return await future
+
+    def _flush(self, target_lang: str) -> None:
+        timer = self._timers.pop(target_lang, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(target_lang, [])
+        self._pending_chars.pop(target_lang, None)
+        if not batch:
+            return
+
+        task = asyncio.create_task(self._send(batch, target_lang))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]], target_lang: str) -> None:
+        texts = [text for text, _ in batch]
+        self.batches += 1
+        self.batched_texts += len(texts)
+
+        try:
+            results = await self.backend.translate(texts, target_lang)
+            if len(results) == len(batch):
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+                return
+            # Results can't be matched to their texts, none of the callers may be left waiting
+            logging.error(f"--- batch of {len(batch)} texts returned {len(results)} translations ---")
+
+        except QuotaExceededError:
+            logging.info("--- Quota exceeded ---")
+        except HTTPStatusError as e:
+            logging.error(f"--- other error translating --- {e.response.status_code}")
+        except Exception as e:
+            logging.error(f"--- other error translating --- {e}")
+
+        self.failed_batches += 1
+        await asyncio.gather(*(self._fallback(text, future, target_lang) for text, future in batch))
+
+    async def _fallback(self, text: str, future: asyncio.Future, target_lang: str) -> None:
+        try:
+            result = (await self.fallback.translate([text], target_lang))[0]
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "texts": self.batched_texts,
+            "avg_batch": round(self.batched_texts / self.batches, 2) if self.batches else 0,
+            "failed": self.failed_batches,
+            "pending": sum(len(b) for b in self._pending.values()),
+        }
+
+
+class TranslatorScheduler:
+    """
+    Routes each text to the best available backend: DeepL while it has quota and its circuit is closed,
+    Google otherwise. DeepL requests slower than the configured latency percentile are hedged with Google.
+    """
+
+    def __init__(self, deepl: Optional[DeepLTranslator], google: GoogleTranslator,
+                 hedge_percentile: float = TRANSLATION_HEDGE_PERCENTILE,
+                 hedge_min_delay: float = TRANSLATION_HEDGE_MIN_DELAY) -> None:
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+
+        self.usage = DeepLUsage()
+        self.deepl_health = BackendHealth("deepl", TRANSLATION_BREAKER_FAILURES, TRANSLATION_BREAKER_RESET)
+        self.google_health = BackendHealth("google", TRANSLATION_BREAKER_FAILURES, TRANSLATION_BREAKER_RESET)
+        self.google = TrackedBackend(google, self.google_health)
+        self.deepl = TrackedBackend(deepl, self.deepl_health, self.usage) if deepl is not None else None
+        self.batcher = DeepLBatcher(self.deepl, self.google) if self.deepl is not None else None
+
+        # End-to-end DeepL latency including batching, basis for the hedge delay
+        self.primary_latency = LatencyWindow()
+        self.routed = {"deepl": 0, "google": 0}
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _use_deepl(self, chars: int) -> bool:
+        if self.batcher is None or not self.usage.has_quota(chars):
+            return False
+        if self.deepl_health.breaker.allow():
+            return True
+        # Both circuits open: keep trying DeepL rather than failing outright
+        return not self.google_health.breaker.available()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay after which a slow DeepL request is hedged, None until enough latencies were seen."""
+        if len(self.primary_latency) < 20:
+            return None
+        return max(self.hedge_min_delay, self.primary_latency.percentile(self.hedge_percentile))
+
+    async def translate(self, text: str, target_lang: str) -> str:
+        if self._use_deepl(len(text)):
+            self.routed["deepl"] += 1
+            return await self._translate_hedged(text, target_lang)
+
+        self.routed["google"] += 1
+        return await self._translate_google(text, target_lang)
+
+    async def _translate_google(self, text: str, target_lang: str) -> str:
+        return (await self.google.translate([text], target_lang))[0]
+
+    def _record_primary(self, future: asyncio.Future, start: float) -> None:
+        if not future.cancelled() and future.exception() is None:
+            self.primary_latency.add(time.perf_counter() - start)
+
+    async def _translate_hedged(self, text: str, target_lang: str) -> str:
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self.batcher.translate(text, target_lang))
+        # Keep measuring the primary even if the hedge wins, its request is in flight anyway
+        primary.add_done_callback(lambda f: self._record_primary(f, start))
+
+        delay = self.hedge_delay()
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.hedged += 1
+        hedge = asyncio.ensure_future(self._translate_google(text, target_lang))
+        done, _ = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+        winner = done.pop()
+        other = hedge if winner is primary else primary
+
+        if winner.exception() is not None:
+            return await other
+
+        if winner is primary:
+            hedge.cancel()
+        else:
+            self.hedge_wins += 1
+            # Let the batched request finish in the background, its result is simply discarded
+            self._tasks.add(primary)
+            primary.add_done_callback(self._tasks.discard)
+        return winner.result()
+
+    async def sync_usage(self) -> None:
+        """Fetch DeepL character usage, so routing switches proactively before the quota runs out."""
+        if self.deepl is None:
+            return
+        try:
+            count, limit = await self.deepl.backend.get_usage()
+            self.usage.sync(count, limit)
+        except Exception as e:
+            logging.warning(f"Failed to fetch DeepL usage: {e}")
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "routed": self.routed,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay": self.hedge_delay(),
+            "usage": self.usage.state(),
+            "deepl": self.deepl_health.state(),
+            "google": self.google_health.state(),
+            "batches": self.batcher.stats() if self.batcher is not None else None,
+        }
+
+
+_scheduler: Optional[TranslatorScheduler] = None
+
+
+def get_scheduler() -> TranslatorScheduler:
+    """Get or create the translator scheduler. DeepL is left out if no key is configured."""
+    global _scheduler
+    if _scheduler is None:
+        deepl = None
+        if DEEPL:
+            try:
+                deepl = DeepLTranslator(DEEPL)
+            except Exception as e:
+                logging.error(f"Failed to initialize DeepL: {e}")
+        _scheduler = TranslatorScheduler(deepl, GoogleTranslator())
+    return _scheduler
+
+
+async def translate_text(text: str, target_lang: str = "de") -> str:
+    """Translate with the best available backend, DeepL first, Google on quota, failures or slowness."""
+    return await get_scheduler().translate(text, target_lang)
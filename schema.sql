@@ -1,5 +1,13 @@
 --drop table posts;
 --ALTER TABLE posts ADD COLUMN  media_id bigint;
+--ALTER TABLE posts DROP CONSTRAINT posts_pkey, DROP CONSTRAINT IF EXISTS unique_source_message, ADD PRIMARY KEY (destination, message_id);
+--DROP INDEX IF EXISTS posts_backup_id;
+--CREATE INDEX posts_source ON posts(source_channel_id, source_message_id);
+--CREATE INDEX posts_backup_id ON posts(backup_id, destination);
+--ALTER TABLE sources ADD COLUMN language VARCHAR(8);
+--ALTER TABLE posts ADD COLUMN created_at TIMESTAMPTZ NOT NULL DEFAULT now();
+--CREATE INDEX posts_created_at ON posts(created_at);
+--ALTER TABLE jobs ADD COLUMN reply_id INT;
 CREATE TABLE destinations
   (
      channel_id BIGINT NOT NULL,
@@ -23,6 +31,7 @@ CREATE TABLE sources
      detail_id    INT,
      is_spread boolean  default true,
      is_active boolean  default false,
+     language     VARCHAR(8),
      PRIMARY KEY (channel_id),
      CONSTRAINT fk_destination FOREIGN KEY(destination) REFERENCES destinations(
      channel_id),
@@ -48,13 +57,12 @@ CREATE TABLE posts
      reply_id          INT,
      message_text      TEXT,
      file_id           BIGINT,
-     PRIMARY KEY (source_channel_id, source_message_id),
+     created_at        TIMESTAMPTZ NOT NULL DEFAULT now(),
+     PRIMARY KEY (destination, message_id),
      CONSTRAINT fk_channel FOREIGN KEY(source_channel_id) REFERENCES sources(
      channel_id),
      CONSTRAINT fk_destination FOREIGN KEY(destination) REFERENCES destinations(
      channel_id)
-      CONSTRAINT unique_source_message
-   UNIQUE (source_channel_id, source_message_id)
   );
 
 CREATE TABLE accounts
@@ -66,4 +74,60 @@ CREATE TABLE accounts
      phone_number VARCHAR(14) NOT NULL,
      description  TEXT,
      PRIMARY KEY (api_id)
-  );
\ No newline at end of file
+  );
+CREATE TABLE translations
+  (
+     key             CHAR(64) NOT NULL,
+     translated_text TEXT NOT NULL,
+     created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+     PRIMARY KEY (key)
+  );
+
+CREATE INDEX translations_created_at ON translations(created_at);
+
+CREATE TABLE routes
+  (
+     key        CHAR(64) NOT NULL,
+     region     VARCHAR(128) NOT NULL,
+     confidence REAL NOT NULL,
+     created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+     PRIMARY KEY (key)
+  );
+
+CREATE INDEX routes_created_at ON routes(created_at);
+
+CREATE TABLE gazetteer
+  (
+     destination BIGINT NOT NULL,
+     keyword     TEXT NOT NULL,
+     weight      REAL NOT NULL DEFAULT 1,
+     PRIMARY KEY (destination, keyword),
+     CONSTRAINT fk_destination FOREIGN KEY(destination) REFERENCES destinations(
+     channel_id)
+  );
+
+CREATE INDEX posts_created_at ON posts(created_at);
+-- A source message has its backup row and the row of the post spread from it
+CREATE INDEX posts_source ON posts(source_channel_id, source_message_id);
+CREATE INDEX posts_backup_id ON posts(backup_id, destination);
+
+-- Work queue from the collector to the processors, claimed with FOR UPDATE SKIP LOCKED.
+-- Running jobs whose visible_at passed belong to a crashed processor and are claimed again.
+CREATE TABLE jobs
+  (
+     id             BIGSERIAL,
+     backup_id      INT NOT NULL,
+     media_group_id VARCHAR(32),
+     reply_id       INT,
+     status         VARCHAR(8) NOT NULL DEFAULT 'pending',
+     attempts       INT NOT NULL DEFAULT 0,
+     visible_at     TIMESTAMPTZ NOT NULL DEFAULT now(),
+     locked_by      VARCHAR(64),
+     last_error     TEXT,
+     created_at     TIMESTAMPTZ NOT NULL DEFAULT now(),
+     PRIMARY KEY (id),
+     UNIQUE (backup_id)
+  );
+
+CREATE INDEX jobs_claimable ON jobs(visible_at) WHERE status IN ('pending', 'running');
+CREATE INDEX jobs_media_group ON jobs(media_group_id, backup_id) WHERE media_group_id IS NOT NULL;
@@ -0,0 +1,60 @@
+"""
+Per-message cost of bloat matching as the pattern count grows.
+Compares the regex alternation used before with the Aho-Corasick automaton in bot.matcher.
+
+Run from the repository root: PYTHONPATH=. python test/bench/bench_matcher.py
+"""
+import random
+import time
+
+import regex as re
+
+from bot.matcher import PatternMatcher
+
+WORDS = ("Підписатись на канал наш новини Україна підтримай ЗСУ донат грн допоможе нам працювати далі "
+         "support us on patreon paypal subscribe telegram twitter youtube facebook official channel").split()
+
+MESSAGE = ("🇺🇦 Сили оборони України відбили атаку на Покровському напрямку, повідомляє Генштаб. "
+           "Противник втратив техніку та особовий склад. " * 12)
+
+SIZES = (10, 100, 1000, 10000)
+ROUNDS = 200
+
+
+def make_patterns(n: int, rng: random.Random):
+    return list({" ".join(rng.choices(WORDS, k=rng.randint(3, 8))) + f" #{i}" for i in range(n)})
+
+
+def bench(fn, text: str) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(text)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'patterns':>8} {'regex build ms':>15} {'regex µs/msg':>13} {'ac build ms':>12} {'ac µs/msg':>10}")
+
+    for n in SIZES:
+        patterns = make_patterns(n, rng)
+        text = MESSAGE + "\n\n" + patterns[n // 2]
+
+        start = time.perf_counter()
+        alternation = re.compile(f"(?:{'|'.join(re.escape(p) for p in patterns)})", flags=re.IGNORECASE)
+        alternation.search(text)
+        regex_build = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        matcher = PatternMatcher(patterns, automaton_min=0)
+        ac_build = (time.perf_counter() - start) * 1000
+
+        assert alternation.subn("", text)[1] == matcher.remove(text)[1] == 1
+
+        regex_cost = bench(lambda t: alternation.subn("", t), text)
+        ac_cost = bench(matcher.remove, text)
+        print(f"{n:>8} {regex_build:>15.1f} {regex_cost:>13.1f} {ac_build:>12.1f} {ac_cost:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
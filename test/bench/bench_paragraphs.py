@@ -0,0 +1,51 @@
+"""
+Paragraph segmentation on 1 KB - 100 KB articles: legacy lookbehind split versus the linear-time segmenter.
+
+Run from the repository root: PYTHONPATH=.:bot python test/bench/bench_paragraphs.py
+"""
+import time
+
+import regex as re
+
+from bot.translation import iter_paragraphs
+
+LEGACY_PARAGRAPH = re.compile(r'(?<=\D{20,}[\.\!\?])\s+')
+
+# Digit-sparse prose is the worst case for the variable-length lookbehind
+SENTENCE = "Die Lage an der Front bleibt angespannt, die Verteidiger halten ihre Stellungen. "
+SIZES = (1_000, 10_000, 50_000, 100_000)
+
+
+def legacy(text: str) -> str:
+    res = []
+    for chunk in re.split(LEGACY_PARAGRAPH, text):
+        if res and len(chunk) + len(res[-1]) < 440:
+            res[-1] += f' {chunk}'
+        else:
+            res.append(f'{chunk}')
+    return "\n\n".join(res)
+
+
+def segmenter(text: str) -> str:
+    return "\n\n".join(iter_paragraphs(text))
+
+
+def bench(fn, text: str, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(text)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    print(f"{'size':>8} {'legacy ms':>10} {'segmenter ms':>13}")
+    for size in SIZES:
+        text = (SENTENCE * (size // len(SENTENCE) + 1))[:size]
+        assert legacy(text) == segmenter(text)
+
+        rounds = max(1, 200_000 // size)
+        print(f"{size:>8} {bench(legacy, text, rounds):>10.2f} {bench(segmenter, text, rounds):>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Microbenchmarks for the text hot path over the recorded posts in corpus.json:
+debloat_message, debloat_text (translator stubbed out), chunk_paragraphs, truncate_text and format_text.
+
+Reports throughput and latency percentiles per stage and compares them with baseline.json.
+Exits with status 1 if a stage's median or p95 got slower than the baseline by more than the tolerance.
+Baselines are machine specific, regenerate them with --update-baseline before judging a change.
+
+Run from the repository root: PYTHONPATH=.:bot python test/bench/bench_pipeline.py [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List
+
+import bot.translation as translation
+from bot.debloat import compile_debloat_program
+from bot.model import SourceDisplay
+
+BENCH_PATH = Path(__file__).parent
+CORPUS_PATH = BENCH_PATH / "corpus.json"
+BASELINE_PATH = BENCH_PATH / "baseline.json"
+
+ROUNDS = 200
+WARMUP = 20
+# Differences below this are timer noise for the sub-microsecond stages
+MIN_DELTA_US = 2.0
+
+
+class FakeMessage(SimpleNamespace):
+    async def forward(self, chat_id):
+        pass
+
+
+class FakeClient:
+    async def send_message(self, chat_id, text, **kwargs):
+        pass
+
+
+class FakeCache:
+    """Stands in for DBCache, with the programs compiled up front like after warm_cache()."""
+
+    def __init__(self, corpus: List[dict]) -> None:
+        self.sources = {}
+        self.programs = {}
+        for post in corpus:
+            source = post["source"]
+            self.sources[source["channel_id"]] = SourceDisplay(
+                display_name=source["display_name"], bias=source.get("bias"), username=source.get("username"),
+                invite=source.get("invite"), language=source.get("language"))
+            self.programs[source["channel_id"]] = compile_debloat_program(post["patterns"], source.get("username"))
+
+    async def get_source(self, channel_id: int) -> SourceDisplay:
+        return self.sources[channel_id]
+
+    async def get_debloat_program(self, channel_id: int, username: str):
+        return self.programs[channel_id]
+
+
+class PassThroughCache:
+    """Translation memo that never hits, so every round goes through the (stubbed) translator."""
+
+    async def get_or_translate(self, text, target_lang, is_caption, factory):
+        return await factory()
+
+
+async def stub_translate_text(text: str, target_lang: str = "de") -> str:
+    return text
+
+
+def make_message(post: dict, message_id: int) -> FakeMessage:
+    source = post["source"]
+    chat = SimpleNamespace(id=source["channel_id"], username=source.get("username"))
+    return FakeMessage(
+        id=message_id,
+        chat=chat,
+        forward_from_chat=None,
+        caption=post["text"] if post["caption"] else None,
+        text=None if post["caption"] else post["text"],
+        link=f"https://t.me/{source.get('username') or 'c'}/{message_id}",
+    )
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def measure(fn: Callable[[dict, FakeMessage], Awaitable], corpus: List[dict],
+                  messages: List[FakeMessage]) -> Dict[str, float]:
+    for _ in range(WARMUP):
+        for post, message in zip(corpus, messages):
+            await fn(post, message)
+
+    samples = []
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for post, message in zip(corpus, messages):
+            t = time.perf_counter()
+            await fn(post, message)
+            samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "ops_per_s": round(len(samples) / elapsed, 1),
+        "p50_us": round(percentile(samples, 50) * 1e6, 2),
+        "p95_us": round(percentile(samples, 95) * 1e6, 2),
+        "p99_us": round(percentile(samples, 99) * 1e6, 2),
+    }
+
+
+async def run(corpus: List[dict]) -> Dict[str, Dict[str, float]]:
+    translation.translate_text = stub_translate_text
+    translation.get_translation_cache = PassThroughCache
+
+    cache = FakeCache(corpus)
+    client = FakeClient()
+    messages = [make_message(post, i) for i, post in enumerate(corpus, start=1)]
+
+    # Inputs for the pure stages are taken from the real pipeline output, like in production
+    debloated = [await translation.debloat_text(m, client, cache, is_caption=p["caption"])
+                 for p, m in zip(corpus, messages)]
+    assert all(debloated), "every corpus post must survive debloating"
+    by_message = {m.id: text for m, text in zip(messages, debloated)}
+    limit = translation.TELEGRAM_CAPTION_LIMIT - translation.FOOTER_RESERVE
+
+    async def debloat_message(post, message):
+        await translation.debloat_message(message, client, cache)
+
+    async def debloat_text(post, message):
+        await translation.debloat_text(message, client, cache, is_caption=post["caption"])
+
+    async def chunk_paragraphs(post, message):
+        translation.chunk_paragraphs(by_message[message.id])
+
+    async def truncate_text(post, message):
+        translation.truncate_text(post["text"], limit)
+
+    async def format_text(post, message):
+        await translation.format_text(by_message[message.id], message, cache.sources[message.chat.id], message.id)
+
+    stages = {
+        "debloat_message": debloat_message,
+        "debloat_text": debloat_text,
+        "chunk_paragraphs": chunk_paragraphs,
+        "truncate_text": truncate_text,
+        "format_text": format_text,
+    }
+    return {name: await measure(fn, corpus, messages) for name, fn in stages.items()}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ("p50_us", "p95_us"):
+            if result[metric] > base[metric] * (1 + tolerance) and result[metric] - base[metric] > MIN_DELTA_US:
+                regressions.append(f"{name} {metric}: {base[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown relative to the baseline, 0.25 = 25%%")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    # The oversize caption is truncated through a placeholder on every round, don't print that warning each time
+    logging.disable(logging.WARNING)
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    results = asyncio.run(run(corpus))
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    print(f"{'stage':<18} {'ops/s':>10} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'base p50':>9}")
+    for name, r in results.items():
+        base = baseline.get(name, {}).get("p50_us", "-")
+        print(f"{name:<18} {r['ops_per_s']:>10} {r['p50_us']:>9} {r['p95_us']:>9} {r['p99_us']:>9} {base:>9}")
+
+    if args.update_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Emoji/link protection on emoji-heavy posts: legacy verbose placeholder with per-emoji restore
+versus short indexed tags restored in one pass. Reports time per message and characters sent to DeepL.
+
+Run from the repository root: PYTHONPATH=.:bot python test/bench/bench_placeholder.py
+"""
+import time
+
+import regex as re
+
+from bot.constant import emoji_pattern, LEGACY_PLACEHOLDER
+from bot.translation import protect_tokens, restore_tokens
+
+LINE = "🔥 Вибухи в <a href='https://t.me/x/1'>Харкові</a> ‼️ 🇺🇦 Сили ППО працюють 🚀🚀 💥 "
+POSTS = {f"{n} lines": LINE * n for n in (1, 10, 50, 200)}
+ROUNDS = 200
+
+
+def legacy(text: str) -> str:
+    emojis = emoji_pattern.findall(text)
+    text = emoji_pattern.sub(LEGACY_PLACEHOLDER, text)
+    for emoji in emojis:
+        text = re.sub(LEGACY_PLACEHOLDER, emoji, text, 1)
+    return text
+
+
+def indexed(text: str) -> str:
+    protected, tokens = protect_tokens(text)
+    return restore_tokens(protected, tokens)
+
+
+def bench(fn, text: str) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(text)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+def main():
+    print(f"{'post':>10} {'tokens':>7} {'legacy chars':>13} {'indexed chars':>14} "
+          f"{'legacy µs':>10} {'indexed µs':>11}")
+
+    for name, text in POSTS.items():
+        assert legacy(text) == indexed(text) == text
+
+        protected, tokens = protect_tokens(text)
+        legacy_chars = len(emoji_pattern.sub(LEGACY_PLACEHOLDER, text))
+        print(f"{name:>10} {len(tokens):>7} {legacy_chars:>13} {len(protected):>14} "
+              f"{bench(legacy, text):>10.1f} {bench(indexed, text):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Load benchmark of the LLM routing path against mock_openrouter.py.
+Drives get_destination with Poisson arrivals of the corpus posts (made unique, so the route cache never hits and
+the gazetteer and learned router are bypassed) and reports routing latency percentiles, the share of posts that fell
+back to the source's default destination, batching and model stats and the connection pool usage of the shared
+AsyncClient.
+
+ROUTING_STAGGER, ROUTING_BUDGET and ROUTING_BATCH_* are read from the environment as in production.
+
+Run from the repository root:
+    PYTHONPATH=.:bot python test/bench/bench_routing.py --rate 20 --duration 30 --rate-429 0.05 --rate-markdown 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+import bot.destination as destination
+import bot.model_registry as model_registry
+from bot.classifier import HashingNaiveBayes
+from bot.route_cache import RouteCache
+
+sys.path.insert(0, str(Path(__file__).parent))
+from mock_openrouter import MockOpenRouter, add_arguments, config_from_args  # noqa: E402
+
+CORPUS_PATH = Path(__file__).parent / "corpus.json"
+
+REGIONS = ["ukraine", "afrika", "asien", "naher osten", "kaukasus", "südamerika"]
+SOURCE_ID = 1
+DEFAULT_DESTINATION = 999
+POOL_SAMPLE_INTERVAL = 0.02
+MODEL_STATS = ("calls", "errors", "rate_limited", "throttled", "circuit")
+
+
+class FakeCache:
+    """Stands in for DBCache with a fixed destination set and no gazetteer."""
+
+    def __init__(self) -> None:
+        self.dest_map = {region: i for i, region in enumerate(REGIONS, start=1)}
+
+    async def get_source(self, channel_id: int) -> SimpleNamespace:
+        return SimpleNamespace(destination=DEFAULT_DESTINATION)
+
+    def get_destination_map(self) -> Dict[str, int]:
+        return self.dest_map
+
+    def get_destination_regions(self) -> List[str]:
+        return REGIONS
+
+    def get_destination_version(self) -> str:
+        return "bench"
+
+    def get_gazetteer(self):
+        return None
+
+
+class PoolSampler:
+    """Samples the httpcore connection pool behind the shared AsyncClient."""
+
+    def __init__(self) -> None:
+        self.samples: List[Dict[str, int]] = []
+
+    def sample(self) -> None:
+        pool = destination.get_http_client()._transport._pool
+        connections = pool.connections
+        self.samples.append({
+            "open": len(connections),
+            "active": sum(not c.is_idle() for c in connections),
+            "queued": sum(r.is_queued() for r in pool._requests),
+        })
+
+    async def run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(POOL_SAMPLE_INTERVAL)
+
+    def stats(self) -> Dict[str, float]:
+        if not self.samples:
+            return {}
+        result = {}
+        for metric in ("open", "active", "queued"):
+            values = [s[metric] for s in self.samples]
+            result[f"max_{metric}"] = max(values)
+            result[f"mean_{metric}"] = round(sum(values) / len(values), 2)
+        return result
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def run(args: argparse.Namespace, texts: List[str]) -> Dict[str, object]:
+    server = MockOpenRouter(config_from_args(args))
+    destination.OPENROUTER_URL = await server.start()
+    destination.OPENROUTER_API_KEY = "bench"
+    destination.get_router = HashingNaiveBayes
+    route_cache = RouteCache(persist=False)
+    destination.get_route_cache = lambda: route_cache
+    model_registry.ROUTING_MODEL_RPM = args.rpm
+    model_registry.ROUTING_MODEL_BURST = args.burst
+
+    cache = FakeCache()
+    sampler = PoolSampler()
+    sampler_task = asyncio.create_task(sampler.run())
+    rng = random.Random(args.seed)
+    latencies: List[float] = []
+    fallbacks = 0
+
+    async def route(text: str) -> None:
+        nonlocal fallbacks
+        start = time.perf_counter()
+        result = await destination.get_destination(text, SOURCE_ID, cache)
+        latencies.append(time.perf_counter() - start)
+        if result == DEFAULT_DESTINATION:
+            fallbacks += 1
+
+    tasks = []
+    started = time.perf_counter()
+    i = 0
+    while time.perf_counter() - started < args.duration:
+        # Unique suffix, so every post is classified instead of served from the route cache
+        tasks.append(asyncio.create_task(route(f"{texts[i % len(texts)]} {i}")))
+        i += 1
+        await asyncio.sleep(rng.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+
+    sampler_task.cancel()
+    await destination.get_http_client().aclose()
+    await server.stop()
+
+    return {
+        "posts": len(latencies),
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p90_s": round(percentile(latencies, 90), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "max_s": round(max(latencies), 3),
+        "fallback_rate": round(fallbacks / len(latencies), 3),
+        "routing": dict(destination.routing_stats),
+        "batches": destination.get_routing_batcher().stats(),
+        "pool": sampler.stats(),
+        "models": {model: {k: state[k] for k in MODEL_STATS}
+                   for model, state in destination.get_model_registry().state().items()},
+        "mock": server.stats(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=10.0, help="posts per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--rpm", type=float, default=model_registry.ROUTING_MODEL_RPM,
+                        help="requests per minute allowed per model")
+    parser.add_argument("--burst", type=float, default=model_registry.ROUTING_MODEL_BURST,
+                        help="token bucket size per model")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        texts = [post["text"] for post in json.load(f)]
+
+    report = asyncio.run(run(args, texts))
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0
+
+    print(f"posts {report['posts']}  p50 {report['p50_s']}s  p90 {report['p90_s']}s  p99 {report['p99_s']}s  "
+          f"max {report['max_s']}s  fallback {report['fallback_rate']:.1%}")
+    for key in ("routing", "batches", "pool", "models", "mock"):
+        print(f"{key:<8} {report[key]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
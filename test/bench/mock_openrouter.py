@@ -0,0 +1,215 @@
+"""
+Local stand-in for the OpenRouter chat completions endpoint, for load tests of the routing path.
+Answers single and batch classification prompts with a random region from the prompt and can misbehave on demand:
+latency drawn from a distribution (per model if wanted), 429 with Retry-After, 5xx, malformed JSON
+and markdown-wrapped answers.
+
+Latency specs: fixed:S, uniform:LOW,HIGH, exp:MEAN, lognormal:MEDIAN,SIGMA (all in seconds).
+
+Standalone, to point a real processor at it with OPENROUTER_URL=http://127.0.0.1:8089/api/v1/chat/completions:
+    PYTHONPATH=.:bot python test/bench/mock_openrouter.py --port 8089 --latency lognormal:0.8,0.6 --rate-429 0.05
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+COMPLETIONS_PATH = "/api/v1/chat/completions"
+
+PATTERN_REGIONS = re.compile(r"ONE of these regions: (.+?)\.\n")
+PATTERN_BATCH = re.compile(r"each of the following (\d+) numbered")
+
+REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error",
+           502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Sampler for a latency spec like "lognormal:0.8,0.5"."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",")] if args else []
+    if kind == "fixed":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / values[0])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "lognormal:0.8,0.5"
+    # model -> latency spec, for models that should be slower or faster than the rest
+    model_latency: Dict[str, str] = field(default_factory=dict)
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    rate_malformed: float = 0.0
+    rate_markdown: float = 0.0
+    retry_after: float = 30.0
+    min_confidence: float = 0.6
+    seed: Optional[int] = None
+
+
+class MockOpenRouter:
+    """Minimal HTTP/1.1 server with keep-alive, enough for httpx."""
+
+    def __init__(self, config: MockConfig) -> None:
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self._latency = parse_latency(config.latency)
+        self._model_latency = {m: parse_latency(s) for m, s in config.model_latency.items()}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        self.requests: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.answers: Counter = Counter()
+        self.connections = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start listening, returns the completions URL."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}{COMPLETIONS_PATH}"
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "POST" and path == COMPLETIONS_PATH:
+                    status, extra, payload = await self._complete(json.loads(body))
+                else:
+                    status, extra, payload = 404, {}, b'{"error": "not found"}'
+                self.statuses[status] += 1
+
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}", "Content-Type: application/json",
+                        f"Content-Length: {len(payload)}"]
+                head += [f"{k}: {v}" for k, v in extra.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _complete(self, request: dict) -> Tuple[int, Dict[str, str], bytes]:
+        model = request.get("model", "")
+        self.requests[model] += 1
+        await asyncio.sleep(self._model_latency.get(model, self._latency)(self.rng))
+
+        roll = self.rng.random()
+        if roll < self.config.rate_429:
+            return 429, {"Retry-After": f"{self.config.retry_after:g}"}, b'{"error": "rate limited"}'
+        if roll < self.config.rate_429 + self.config.rate_5xx:
+            return self.rng.choice([500, 502, 503]), {}, b'{"error": "upstream error"}'
+
+        content = self._answer(request["messages"][-1]["content"])
+        roll = self.rng.random()
+        if roll < self.config.rate_malformed:
+            self.answers["malformed"] += 1
+            content = content[:len(content) // 2]
+        elif roll < self.config.rate_malformed + self.config.rate_markdown:
+            self.answers["markdown"] += 1
+            content = f"Here is the classification:\n```json\n{content}\n```"
+        else:
+            self.answers["json"] += 1
+
+        response = {"id": "mock", "model": model, "choices": [{"index": 0, "finish_reason": "stop",
+                                                               "message": {"role": "assistant", "content": content}}]}
+        return 200, {}, json.dumps(response).encode()
+
+    def _answer(self, prompt: str) -> str:
+        match = PATTERN_REGIONS.search(prompt)
+        regions = [r.strip() for r in match.group(1).split(",")] if match else ["unknown"]
+
+        def decision() -> dict:
+            return {"region": self.rng.choice(regions),
+                    "confidence": round(self.rng.uniform(self.config.min_confidence, 1.0), 2)}
+
+        batch = PATTERN_BATCH.search(prompt)
+        if batch:
+            return json.dumps({"results": [decision() for _ in range(int(batch.group(1)))]})
+        return json.dumps(decision())
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            "requests": dict(self.requests),
+            "statuses": dict(self.statuses),
+            "answers": dict(self.answers),
+            "connections": self.connections,
+        }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", default=MockConfig.latency, help="latency spec for all models")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="latency spec for one model, repeatable")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="share of requests answered with 5xx")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="share of answers cut in half")
+    parser.add_argument("--rate-markdown", type=float, default=0.0, help="share of answers wrapped in markdown")
+    parser.add_argument("--retry-after", type=float, default=MockConfig.retry_after, help="Retry-After of 429s")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible runs")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency=args.latency,
+        model_latency=dict(spec.split("=", 1) for spec in args.model_latency),
+        rate_429=args.rate_429,
+        rate_5xx=args.rate_5xx,
+        rate_malformed=args.rate_malformed,
+        rate_markdown=args.rate_markdown,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+async def serve(config: MockConfig, host: str, port: int) -> None:
+    server = MockOpenRouter(config)
+    url = await server.start(host, port)
+    print(f"Mock OpenRouter listening on {url}")
+    try:
+        while True:
+            await asyncio.sleep(30)
+            print(server.stats())
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(config_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
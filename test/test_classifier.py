@@ -0,0 +1,70 @@
+import bot.classifier as classifier
+from bot.classifier import HashingNaiveBayes, strip_footer
+
+UKRAINE = ["Russische Drohnen griffen in der Nacht die Stadt an, die Luftabwehr war im Einsatz",
+           "Die Front bei Pokrowsk bleibt umkämpft, die Verteidiger halten ihre Stellungen",
+           "Raketenangriff auf das Energienetz, Stromausfälle in mehreren Oblasten"]
+AFRIKA = ["Die Militärjunta in Niamey kündigte Wahlen an, die Opposition bleibt skeptisch",
+          "Im Sudan gehen die Kämpfe zwischen Armee und RSF weiter, Hunderttausende fliehen",
+          "Dschihadisten griffen einen Militärposten im Sahel an"]
+
+
+def make_model():
+    model = HashingNaiveBayes()
+    for _ in range(5):
+        for text in UKRAINE:
+            model.learn(text, 1)
+        for text in AFRIKA:
+            model.learn(text, 2)
+    return model
+
+
+def test_predicts_learned_destination(monkeypatch):
+    monkeypatch.setattr(classifier, "ROUTER_MIN_DOCS", 10)
+    model = make_model()
+
+    label, confidence = model.predict("Drohnen und Raketen auf die Stadt, die Luftabwehr meldet Abschüsse")
+    assert label == 1
+    assert confidence > 0.5
+    assert model.predict("Neue Kämpfe im Sudan, die RSF rückt vor")[0] == 2
+
+
+def test_too_little_data(monkeypatch):
+    monkeypatch.setattr(classifier, "ROUTER_MIN_DOCS", 1000)
+    assert make_model().predict("Drohnen auf die Stadt") is None
+
+
+def test_save_and_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(classifier, "ROUTER_MIN_DOCS", 10)
+    model = make_model()
+    model.trained_until = "2024-03-01T00:00:00+00:00"
+    model.save(tmp_path / "router.json.gz")
+
+    loaded = HashingNaiveBayes.load(tmp_path / "router.json.gz")
+    assert loaded.trained_until == model.trained_until
+    assert len(loaded) == len(model)
+    assert loaded.predict(UKRAINE[0]) == model.predict(UKRAINE[0])
+
+
+def test_strip_footer():
+    assert strip_footer("Text\n\nQuelle: <a href='x'>Kanal</a>") == "Text"
+
+
+async def test_learned_posts_advance_trained_until_and_reload(tmp_path, monkeypatch):
+    path = tmp_path / "router.json.gz"
+    model = make_model()
+    model.learn(UKRAINE[0], 1, "2024-03-02T00:00:00+00:00")
+    model.learn(UKRAINE[1], 1, "2024-03-01T00:00:00+00:00")
+    assert model.trained_until == "2024-03-02T00:00:00+00:00"
+
+    await model.save_async(path)
+    assert not model.dirty
+    monkeypatch.setattr(classifier, "_router", model)
+    assert not classifier.reload_router(path)
+
+    # Written by the training CLI
+    trained = HashingNaiveBayes()
+    trained.learn(AFRIKA[0], 2, "2024-03-05T00:00:00+00:00")
+    trained.save(path)
+    assert classifier.reload_router(path)
+    assert classifier.get_router().trained_until == "2024-03-05T00:00:00+00:00"
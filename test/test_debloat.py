@@ -0,0 +1,26 @@
+from bot.debloat import compile_debloat_program
+
+
+def test_program_removes_bloat_case_insensitive():
+    program = compile_debloat_program(["<b>Підписатись на канал</b>", "paypal.me/x"], "news_ua")
+
+    text, count = program.bloat.remove("Новина дня\n\nпідписатись на канал @news_ua")
+
+    assert count == 1
+    assert program.username_suffix.sub("", text.rstrip()).rstrip() == "Новина дня"
+
+
+def test_program_without_patterns():
+    program = compile_debloat_program([], None)
+
+    assert program.bloat is None
+    assert program.username_suffix is None
+
+
+def test_program_patterns_are_literal():
+    program = compile_debloat_program(["Донат 30 грн (", "Підписатись"], None)
+
+    text, count = program.bloat.remove("Новина. Донат 30 грн (картка). ПІДПИСАТИСЬ")
+
+    assert count == 2
+    assert text == "Новина. картка). "
@@ -0,0 +1,113 @@
+import asyncio
+
+import bot.destination as destination
+from bot.model import RouteDecision
+
+
+def fake_models(delays, answers, started):
+    async def ask(model, prompt, *args):
+        started.append(model)
+        await asyncio.sleep(delays[model])
+        return answers.get(model)
+
+    return ask
+
+
+async def test_race_takes_first_valid_answer_and_cancels_rest(monkeypatch):
+    started = []
+    delays = {"a": 1.0, "b": 0.01, "c": 0.01}
+    monkeypatch.setattr(destination, "_ask", fake_models(delays, {"a": RouteDecision("asien", 0.9),
+                                                                  "b": RouteDecision("afrika", 0.8)}, started))
+
+    decision = await destination.race_models("prompt", ["a", "b", "c"], stagger=0.02, budget=0.5)
+    assert decision == RouteDecision("afrika", 0.8)
+    assert started == ["a", "b"]
+
+
+async def test_race_skips_stagger_after_failure(monkeypatch):
+    started = []
+    delays = {"a": 0.0, "b": 0.0}
+    monkeypatch.setattr(destination, "_ask", fake_models(delays, {"b": RouteDecision("asien", 0.9)}, started))
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    assert await destination.race_models("prompt", ["a", "b"], stagger=5, budget=10) == RouteDecision("asien", 0.9)
+    assert loop.time() - start < 1
+
+
+async def test_race_budget(monkeypatch):
+    started = []
+    monkeypatch.setattr(destination, "_ask", fake_models({"a": 5, "b": 5}, {}, started))
+
+    assert await destination.race_models("prompt", ["a", "b"], stagger=0.01, budget=0.05) is None
+    assert started == ["a", "b"]
+
+
+def test_parse_batch():
+    content = '```json\n{"results": [{"region": "Asien", "confidence": 0.9}, {"region": "afrika", "confidence": 0.7}]}\n```'
+    assert destination.parse_batch(content, 2) == [RouteDecision("asien", 0.9), RouteDecision("afrika", 0.7)]
+    assert destination.parse_batch('[{"region": "asien", "confidence": 0.9}]', 1) == [RouteDecision("asien", 0.9)]
+    assert destination.parse_batch(content, 3) is None
+    assert destination.parse_batch("no idea", 1) is None
+
+
+async def test_batcher_sends_burst_as_one_request(monkeypatch):
+    batches = []
+
+    async def classify_batch(texts, regions, budget):
+        batches.append(texts)
+        return [RouteDecision(text, 0.9) for text in texts]
+
+    monkeypatch.setattr(destination, "classify_batch", classify_batch)
+    batcher = destination.RoutingBatcher(window=0.01)
+
+    results = await asyncio.gather(*(batcher.classify(text, ["a", "b"]) for text in ["x", "y", "z"]))
+    assert [r.region for r in results] == ["x", "y", "z"]
+    assert batches == [["x", "y", "z"]]
+    assert batcher.stats()["avg_batch"] == 3
+
+
+async def test_batcher_falls_back_to_single_calls(monkeypatch):
+    singles = []
+
+    budgets = []
+
+    async def classify_batch(texts, regions, budget):
+        budgets.append(budget)
+        await asyncio.sleep(budget)
+        return None
+
+    async def classify(text, regions, budget):
+        singles.append(text)
+        budgets.append(budget)
+        return RouteDecision(text, 0.6)
+
+    monkeypatch.setattr(destination, "classify_batch", classify_batch)
+    monkeypatch.setattr(destination, "classify", classify)
+    monkeypatch.setattr(destination, "ROUTING_BUDGET", 0.1)
+    batcher = destination.RoutingBatcher(window=0.01)
+
+    results = await asyncio.gather(batcher.classify("x", ["a"]), batcher.classify("y", ["a"]))
+    assert [r.region for r in results] == ["x", "y"]
+    assert sorted(singles) == ["x", "y"]
+    assert batcher.stats()["failed"] == 1
+    # The failed batch and the fallback share the routing budget, counted from when the texts were queued
+    assert budgets[0] + max(budgets[1:]) <= destination.ROUTING_BUDGET
+
+
+async def test_learned_route_never_returns_backup(monkeypatch):
+    class Cache:
+        def get_destination_map(self):
+            return {"backup": destination.CHANNEL_BACKUP, "ukraine": 1}
+
+        def get_gazetteer(self):
+            return None
+
+    class Router:
+        def predict(self, text):
+            return destination.CHANNEL_BACKUP, 0.99999
+
+    monkeypatch.setattr(destination, "get_router", lambda: Router())
+    monkeypatch.setattr(destination, "OPENROUTER_API_KEY", None)
+
+    assert await destination.route_message("Нічна атака дронів", 42, Cache()) == 42
@@ -0,0 +1,55 @@
+from bot.gazetteer import Gazetteer, build_gazetteer
+
+REGIONS = ["ukraine", "kaukasus", "südamerika", "afrika", "asien", "naher osten"]
+
+
+def test_builtin_routes_obvious_posts():
+    gazetteer = build_gazetteer(REGIONS, {})
+
+    assert gazetteer.classify("Russische Drohnen griffen in der Nacht Kiew und Charkiw an.").region == "ukraine"
+    assert gazetteer.classify("Вночі ворог атакував Київ, у Києві працювала ППО").region == "ukraine"
+    assert gazetteer.classify("Israel fliegt Angriffe im Gazastreifen, Hamas meldet Tote").region == "naher osten"
+    assert gazetteer.classify("Paschinjan und Alijew treffen sich in Baku").region == "kaukasus"
+
+
+def test_ambiguous_posts_are_escalated():
+    gazetteer = build_gazetteer(REGIONS, {})
+
+    assert gazetteer.classify("Der Präsident hielt eine Rede vor dem Parlament.") is None
+    # Only one weak hit
+    assert gazetteer.classify("Ein Treffen in Peking ist geplant.") is None
+    # Two regions with similar weight
+    assert gazetteer.classify("Iran liefert Drohnen an Russland, die über der Ukraine und Kiew eingesetzt werden, "
+                              "Teheran bestreitet das.") is None
+
+
+def test_word_boundaries_and_stems():
+    gazetteer = Gazetteer({"afrika": {"mali": 1.0}, "ukraine": {"києв*": 1.0}}, min_score=1, min_share=0.5)
+
+    assert gazetteer.scores("Somalia und Malibu") == {}
+    assert gazetteer.scores("Mali, Києві") == {"afrika": 1.0, "ukraine": 1.0}
+
+
+def test_table_entries_replace_builtin_keywords():
+    gazetteer = build_gazetteer(["ukraine", "afrika"], {"afrika": {"wagner": 3.0}})
+
+    assert gazetteer.classify("Wagner in Bamako").region == "afrika"
+    assert gazetteer.scores("Sudan") == {}
+
+
+async def test_refresh_falls_back_to_builtin_when_table_fails(monkeypatch):
+    import bot.db_cache as db_cache
+    from bot.model import Destination
+
+    async def get_destinations():
+        return [Destination(channel_id=1, name="Ukraine", group_id=None)]
+
+    async def get_gazetteer():
+        raise ConnectionError("table missing")
+
+    monkeypatch.setattr(db_cache, "_get_destinations", get_destinations)
+    monkeypatch.setattr(db_cache, "_get_gazetteer", get_gazetteer)
+    cache = db_cache.DBCache()
+    await cache.refresh_destinations()
+
+    assert cache.get_gazetteer().classify("Russische Drohnen griffen Kiew und Charkiw an.").region == "ukraine"
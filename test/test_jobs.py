@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+import bot.processor.jobs as jobs
+from bot.model import BackupJob
+from bot.processor.jobs import JobConsumer
+from bot.processor.pipeline import Pipeline, Stage
+
+
+class FakeClient:
+    async def get_messages(self, chat_id, message_id):
+        return SimpleNamespace(id=message_id, empty=False, media_group_id=None)
+
+
+async def test_jobs_are_acknowledged_by_outcome(monkeypatch):
+    acks = []
+
+    async def complete_job(job_id):
+        acks.append((job_id, "done"))
+
+    async def fail_job(job_id, error, retry_delay, max_attempts):
+        acks.append((job_id, "retry"))
+
+    async def handle(job):
+        if job.message.id == 2:
+            raise RuntimeError("translation down")
+        return job.message.id != 3
+
+    monkeypatch.setattr(jobs, "complete_job", complete_job)
+    monkeypatch.setattr(jobs, "fail_job", fail_job)
+    pipeline = Pipeline([Stage("send", handle, 1, 4)])
+    pipeline.start()
+    consumer = JobConsumer(FakeClient(), pipeline)
+
+    for backup_id in (1, 2, 3):
+        await consumer.submit(BackupJob(id=backup_id, backup_id=backup_id, attempts=1))
+    await consumer.submit(BackupJob(id=4, backup_id=4, media_group_id="g", attempts=1, is_first=False))
+    await pipeline.join()
+    await asyncio.sleep(0)
+    await pipeline.stop()
+
+    assert sorted(acks) == [(1, "done"), (2, "retry"), (3, "done"), (4, "done")]
+    assert consumer.state() == {"done": 1, "failed": 1, "dropped": 1, "album part": 1, "in_pipeline": 0,
+                               "leased": 0}
+
+
+async def test_heartbeat_extends_leased_jobs(monkeypatch):
+    extended = []
+
+    async def extend_jobs(job_ids, worker, visibility_timeout):
+        extended.append(sorted(job_ids))
+
+    async def complete_job(job_id):
+        pass
+
+    monkeypatch.setattr(jobs, "extend_jobs", extend_jobs)
+    monkeypatch.setattr(jobs, "complete_job", complete_job)
+    monkeypatch.setattr(jobs, "JOB_VISIBILITY_TIMEOUT", 0.03)
+    consumer = JobConsumer(FakeClient(), Pipeline([Stage("send", None, 1, 1)]))
+    consumer._leases = {1: BackupJob(id=1, backup_id=1), 2: BackupJob(id=2, backup_id=2)}
+
+    heartbeat = asyncio.create_task(consumer._heartbeat())
+    await asyncio.sleep(0.025)
+    await consumer.acknowledge(consumer._leases[1], "done")
+    await asyncio.sleep(0.025)
+    heartbeat.cancel()
+
+    assert extended[0] == [1, 2]
+    assert extended[-1] == [2]
@@ -0,0 +1,35 @@
+from bot.language import LanguageStats, get_detector
+
+
+def test_detect_german():
+    lang, confidence = get_detector().detect(
+        "Die ukrainischen Streitkräfte haben in der Nacht mehrere Drohnen über dem Gebiet Charkiw abgeschossen, "
+        "teilte der Generalstab am Morgen mit.")
+    assert lang == "de"
+    assert confidence >= 0.8
+
+
+def test_detect_english_is_not_german():
+    lang, _ = get_detector().detect(
+        "Ukrainian forces shot down several drones over the Kharkiv region during the night, "
+        "the General Staff said on Monday morning.")
+    assert lang == "en"
+
+
+def test_detect_cyrillic():
+    assert get_detector().detect("Сили оборони України збили вночі шість ударних безпілотників над областю")[0] == "uk"
+    assert get_detector().detect("Вооружённые силы сообщили об успешном отражении атаки, подробности будут объявлены")[0] == "ru"
+
+
+def test_detect_ignores_markup_and_short_text():
+    assert get_detector().detect("<a href='https://t.me/x'>Link</a> @channel") == ("und", 0.0)
+
+
+def test_language_stats_suggests_pin(caplog):
+    caplog.set_level("INFO")
+    stats = LanguageStats(min_posts=3, pin_share=0.6)
+    for lang in ["de", "de", "en"]:
+        stats.record(1, lang)
+
+    assert stats.get(1) == {"de": 2, "en": 1}
+    assert "UPDATE sources SET language = 'de'" in caplog.text
@@ -0,0 +1,38 @@
+import regex as re
+
+from bot.matcher import LiteralMatcher, PatternMatcher
+
+PATTERNS = ["he", "she", "his", "hers", "Підтримай ЗСУ", "paypal"]
+
+
+def reference_spans(patterns, text):
+    pattern = re.compile("|".join(re.escape(p) for p in sorted(patterns, key=len, reverse=True)), re.IGNORECASE)
+    return [m.span() for m in pattern.finditer(text)]
+
+
+def test_finds_overlapping_occurrences():
+    matcher = LiteralMatcher(["he", "she", "hers"])
+
+    assert sorted(matcher.finditer("ushers")) == [(1, 4), (2, 4), (2, 6)]
+
+
+def test_spans_match_regex_alternation():
+    text = "She said his PayPal is hers. підтримай зсу! Ushers, hehe, PAYPALpaypal"
+    matcher = LiteralMatcher(PATTERNS)
+
+    assert matcher.spans(text) == reference_spans(PATTERNS, text)
+
+
+def test_case_folding_keeps_offsets():
+    matcher = LiteralMatcher(["istanbul"])
+
+    assert matcher.spans("İİ İstanbul istanbul") == [(12, 20)]
+
+
+def test_pattern_matcher_removes_all():
+    for automaton_min in (0, 50):
+        matcher = PatternMatcher(["paypal", "patreon.com/"], automaton_min)
+
+        assert matcher.search("Support on PAYPAL")
+        assert not matcher.search("nothing here, patreonXcom/")
+        assert matcher.remove("a paypal b patreon.com/x c PayPal") == ("a  b x c ", 3)
@@ -0,0 +1,78 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.processor.media_group import MediaGroupAssembler
+
+
+def part(message_id, group_id="g"):
+    return SimpleNamespace(id=message_id, media_group_id=group_id)
+
+
+async def test_group_completes_after_quiet_period():
+    groups = []
+
+    async def on_complete(messages):
+        groups.append([m.id for m in messages])
+
+    assembler = MediaGroupAssembler(on_complete, quiet=0.02, max_wait=1)
+    assembler.add(part(2))
+    await asyncio.sleep(0.01)
+    assembler.add(part(1))
+    await asyncio.sleep(0.01)
+    assert groups == []
+
+    await asyncio.sleep(0.03)
+    assert groups == [[1, 2]]
+
+    # Stragglers of a processed group are not taken for a new album
+    assembler.add(part(3))
+    await asyncio.sleep(0.03)
+    assert groups == [[1, 2]]
+    assert assembler.stats()["late_parts"] == 1
+
+
+async def test_group_completes_at_album_size_and_max_wait():
+    groups = []
+
+    async def on_complete(messages):
+        groups.append(messages[0].media_group_id)
+
+    assembler = MediaGroupAssembler(on_complete, quiet=0.05, max_wait=0.08)
+    for i in range(10):
+        assembler.add(part(i, "a"))
+    await asyncio.sleep(0)
+    assert groups == ["a"]
+
+    # Parts keep trickling in, the hard cap still ends the group
+    for i in range(5):
+        assembler.add(part(i, "b"))
+        await asyncio.sleep(0.03)
+    await asyncio.sleep(0.01)
+    assert groups == ["a", "b"]
+    assert assembler.stats()["completed"] == {"quiet": 0, "size": 1, "max_wait": 1, "evicted": 0}
+
+
+async def test_oldest_group_is_evicted_when_full():
+    groups = []
+
+    async def on_complete(messages):
+        groups.append(messages[0].media_group_id)
+
+    assembler = MediaGroupAssembler(on_complete, quiet=1, max_wait=1, max_pending=2)
+    for group_id in "abc":
+        assembler.add(part(1, group_id))
+    await asyncio.sleep(0)
+    assert groups == ["a"]
+    assert assembler.stats()["pending"] == 2
+
+
+async def test_failing_handler_is_logged(caplog):
+    async def on_complete(messages):
+        raise RuntimeError("pipeline stopped")
+
+    assembler = MediaGroupAssembler(on_complete, quiet=0.01, max_wait=1)
+    assembler.add(part(1))
+    await asyncio.sleep(0.03)
+
+    assert "pipeline stopped" in caplog.text
+    assert not assembler._tasks
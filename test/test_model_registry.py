@@ -0,0 +1,40 @@
+from bot.health import TokenBucket
+from bot.model_registry import ModelRegistry, parse_retry_after
+
+
+def test_token_bucket_limits_bursts():
+    bucket = TokenBucket(rate=0, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12
+    assert parse_retry_after(None, default=60) == 60
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon", default=30) == 30
+
+
+def test_rate_limited_model_is_benched():
+    registry = ModelRegistry(["a", "b"])
+    assert registry.acquire("a")
+    registry.record_rate_limit("a", "120")
+
+    assert registry.ordered() == ["b"]
+    assert not registry.acquire("a")
+    assert registry.state()["a"]["rate_limited"] == 1
+    assert registry.state()["a"]["benched_for"] > 100
+
+
+def test_failing_models_rank_last_and_get_benched():
+    registry = ModelRegistry(["a", "b", "c"])
+    registry.record_failure("a")
+    registry.record_success("b", 1.5)
+    registry.record_success("c", 0.5)
+    assert registry.ordered() == ["c", "b", "a"]
+
+    for _ in range(5):
+        registry.record_failure("a")
+    assert registry.ordered() == ["c", "b"]
+    assert registry.state()["a"]["circuit"] == "open"
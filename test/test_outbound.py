@@ -0,0 +1,74 @@
+import asyncio
+
+from pyrogram.errors import FloodWait
+
+from bot.processor.outbound import OutboundScheduler
+
+
+async def test_flood_wait_suspends_only_its_chat():
+    calls = []
+    flooded = False
+
+    def make(chat_id, n):
+        async def call():
+            nonlocal flooded
+            calls.append((chat_id, n))
+            if chat_id == 1 and not flooded:
+                flooded = True
+                error = FloodWait(value=1)
+                # Telegram waits are whole seconds, shortened for the test
+                error.value = 0.05
+                raise error
+            return n
+        return call
+
+    scheduler = OutboundScheduler(rate_per_minute=60_000, burst=10)
+    flooded_send = asyncio.create_task(scheduler.send(1, make(1, "a")))
+    await asyncio.sleep(0.01)
+    assert await scheduler.send(2, make(2, "b")) == "b"
+    assert not flooded_send.done()
+
+    assert await flooded_send == "a"
+    assert calls == [(1, "a"), (2, "b"), (1, "a")]
+    assert scheduler.state()[1]["flood_waits"] == 1
+    assert scheduler.state()[1]["sent"] == 1
+
+
+async def test_other_errors_are_not_retried():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        raise TimeoutError()
+
+    scheduler = OutboundScheduler()
+    try:
+        await scheduler.send(1, call)
+        assert False, "expected the error"
+    except TimeoutError:
+        pass
+    assert calls == 1
+    assert scheduler.state()[1]["failed"] == 1
+
+
+async def test_sends_are_paced_per_chat():
+    scheduler = OutboundScheduler(rate_per_minute=1200, burst=1)
+
+    async def call():
+        return asyncio.get_running_loop().time()
+
+    times = await asyncio.gather(*(scheduler.send(1, call) for _ in range(3)))
+    assert times[2] - times[0] >= 0.09
+
+
+async def test_sends_wait_for_a_token():
+    scheduler = OutboundScheduler(rate_per_minute=60 * 50, burst=1)
+
+    async def call():
+        return asyncio.get_running_loop().time()
+
+    times = await asyncio.gather(*(scheduler.send(1, call) for _ in range(4)))
+
+    # One token every 20ms after the burst
+    assert all(b - a >= 0.019 for a, b in zip(times, times[1:]))
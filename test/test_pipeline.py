@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.processor.pipeline import Job, Pipeline, Stage
+
+
+def make_job(i):
+    return Job(client=None, message=SimpleNamespace(id=i))
+
+
+async def test_parallel_stages_are_joined():
+    seen = []
+
+    async def passthrough(job):
+        return True
+
+    async def translate(job):
+        await asyncio.sleep(0.01)
+        job.text = f"text {job.message.id}"
+        return True
+
+    async def route(job):
+        job.destination = job.message.id % 2
+        return job.message.id != 3
+
+    async def send(job):
+        seen.append((job.message.id, job.text, job.destination))
+        return True
+
+    pipeline = Pipeline([Stage("debloat", passthrough, 2, 4), Stage("translate", translate, 2, 4),
+                         Stage("route", route, 2, 4), Stage("send", send, 1, 4)])
+    pipeline.connect("debloat", "translate", "route").connect("translate", "send").connect("route", "send")
+    pipeline.start()
+    for i in range(5):
+        await pipeline.submit(make_job(i))
+    await pipeline.join()
+    await pipeline.stop()
+
+    assert sorted(seen) == [(0, "text 0", 0), (1, "text 1", 1), (2, "text 2", 0), (4, "text 4", 0)]
+    state = pipeline.state()
+    assert state["route"]["dropped"] == 1
+    assert state["send"]["processed"] == 4
+
+
+async def test_slow_stage_blocks_submit():
+    release = asyncio.Event()
+
+    async def slow(job):
+        await release.wait()
+        return True
+
+    pipeline = Pipeline([Stage("send", slow, 1, 2)])
+    pipeline.start()
+    for i in range(3):
+        await pipeline.submit(make_job(i))
+
+    # One job with the worker, two queued, the next submit has to wait
+    submit = asyncio.create_task(pipeline.submit(make_job(3)))
+    await asyncio.sleep(0.01)
+    assert not submit.done()
+    assert pipeline.state()["send"]["queued"] == 2
+
+    release.set()
+    await submit
+    await pipeline.join()
+    await pipeline.stop()
+    assert pipeline.state()["send"]["processed"] == 4
@@ -0,0 +1,17 @@
+from bot.posted_index import PostedIndex, pack
+
+
+def test_pack_keeps_channel_and_message_apart():
+    keys = {pack(channel, message) for channel in (-1001861018052, -1001861018053, 1723195485)
+            for message in (1, 2, 2 ** 31 - 1)}
+    assert len(keys) == 9
+
+
+def test_contains_after_add():
+    index = PostedIndex()
+    index.add(-1001861018052, 42)
+
+    assert index.contains(-1001861018052, 42)
+    assert not index.contains(-1001861018052, 43)
+    assert not index.contains(-1001861018053, 42)
+    assert index.stats() == {"size": 1, "hits": 1, "misses": 2}
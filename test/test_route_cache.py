@@ -0,0 +1,63 @@
+import bot.destination as destination
+from bot.model import RouteDecision
+from bot.route_cache import RouteCache, make_key
+
+
+class FakeCache:
+    def __init__(self, version="v1"):
+        self.version = version
+
+    def get_destination_map(self):
+        return {"ukraine": 1, "afrika": 2}
+
+    def get_destination_regions(self):
+        return ["ukraine", "afrika"]
+
+    def get_destination_version(self):
+        return self.version
+
+    def get_gazetteer(self):
+        return None
+
+
+def test_make_key_ignores_markup_links_and_case():
+    assert (make_key("<b>Explosions</b> in Kyiv!\nhttps://t.me/x/1", "v1")
+            == make_key("explosions in KYIV https://example.com", "v1"))
+    assert make_key("Explosions in Kyiv", "v1") != make_key("Explosions in Kyiv", "v2")
+
+
+async def test_low_confidence_is_not_reused():
+    cache = RouteCache(maxsize=8, persist=False, min_confidence=0.5)
+    await cache.set("text", "v1", RouteDecision("ukraine", 0.3))
+    await cache.set("other", "v1", RouteDecision("afrika", 0.9))
+
+    assert await cache.get("text", "v1") is None
+    assert await cache.get("other", "v1") == RouteDecision("afrika", 0.9)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["skipped_low_confidence"] == 1
+
+
+async def test_route_message_classifies_once_per_destination_version(monkeypatch):
+    calls = 0
+
+    async def classify(text, regions, budget):
+        nonlocal calls
+        calls += 1
+        return RouteDecision("afrika", 0.8)
+
+    monkeypatch.setattr(destination, "OPENROUTER_API_KEY", "key")
+    monkeypatch.setattr(destination, "classify", classify)
+    monkeypatch.setattr(destination, "get_route_cache", lambda: route_cache)
+    monkeypatch.setattr(destination, "get_routing_batcher", lambda: batcher)
+    batcher = destination.RoutingBatcher(window=0)
+    route_cache = RouteCache(maxsize=8, persist=False)
+
+    cache = FakeCache()
+    assert await destination.route_message("Coup in Niger", 1, cache) == 2
+    assert await destination.route_message("coup in  Niger!", 1, cache) == 2
+    assert calls == 1
+
+    cache.version = "v2"
+    assert await destination.route_message("Coup in Niger", 1, cache) == 2
+    assert calls == 2
@@ -0,0 +1,41 @@
+import bot.thread_map as thread_map
+from bot.model import Post
+from bot.thread_map import ThreadMap
+
+
+async def test_parent_is_served_from_memory(monkeypatch):
+    lookups = []
+
+    async def get_destination_post(backup_id, backup_channel):
+        lookups.append(backup_id)
+        return Post(destination=2, message_id=20, source_channel_id=1, source_message_id=11, backup_id=backup_id)
+
+    monkeypatch.setattr(thread_map, "get_destination_post", get_destination_post)
+    threads = ThreadMap(maxsize=8)
+    threads.add(Post(destination=3, message_id=30, source_channel_id=1, source_message_id=10, backup_id=100))
+
+    assert (await threads.parent(100)).message_id == 30
+    assert (await threads.parent(101)).message_id == 20
+    assert (await threads.parent(101)).message_id == 20
+    assert lookups == [101]
+    assert threads.stats() == {"size": 2, "announced": 0, "memory_hits": 2, "store_hits": 1, "misses": 0}
+
+
+async def test_unknown_parent_is_routed_normally(monkeypatch):
+    async def get_destination_post(backup_id, backup_channel):
+        raise RuntimeError("no database")
+
+    monkeypatch.setattr(thread_map, "get_destination_post", get_destination_post)
+    threads = ThreadMap(maxsize=8)
+
+    assert await threads.parent(100) is None
+    assert threads.stats()["misses"] == 1
+
+
+async def test_only_announced_replies_have_a_parent():
+    threads = ThreadMap(maxsize=8)
+    threads.announce(1, 11, 99)
+
+    assert threads.announced_parent(1, 12) is None
+    assert threads.announced_parent(1, 11) == 99
+    assert threads.stats()["announced"] == 1
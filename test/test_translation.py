@@ -1,4 +1,22 @@
-from bot.translation import chunk_paragraphs
+import random
+
+import regex as re
+
+from bot.translation import (chunk_paragraphs, iter_paragraphs, iter_sentences, protect_tokens, restore_tokens,
+                             truncate_text)
+
+# Former lookbehind splitter, kept as reference for the linear-time segmenter
+LEGACY_PARAGRAPH = re.compile(r'(?<=\D{20,}[\.\!\?])\s+')
+
+
+def legacy_chunk_paragraphs(text: str) -> str:
+    res = []
+    for chunk in LEGACY_PARAGRAPH.split(text):
+        if res and len(chunk) + len(res[-1]) < 440:
+            res[-1] += f' {chunk}'
+        else:
+            res.append(f'{chunk}')
+    return "\n\n".join(res)
 
 LOREM = """🇺🇸 Der frühere US-Präsident Clinton bedauert, dass er die Ukraine ermutigt hat, Atomwaffen aufzugeben
 
@@ -19,5 +37,48 @@ Laut Clinton wusste er, dass Putin im Gegensatz zu seinem Vorgänger Jelzin kein
     assert result == expected
 
 
+def test_protect_and_restore_tokens():
+    text = "🇺🇦 Удар по <a href='https://t.me/x'>Харкову</a> ‼️"
+    protected, tokens = protect_tokens(text)
+
+    assert "🇺" not in protected and "<a" not in protected
+    assert restore_tokens(protected, tokens) == text
+
+
+def test_restore_tolerates_reordering_and_dropping():
+    tokens = ["🔥", "<a href='x'>", "</a>"]
+
+    assert restore_tokens("<e1/>Link<e2/> <e0/>", tokens) == "<a href='x'>Link</a> 🔥"
+    assert restore_tokens("< e0 />Text</e0> <e1/>Link", tokens) == "🔥Text <a href='x'>Link</a>"
+    assert restore_tokens("<e2/>Text<e1/>Link", tokens) == "Text<a href='x'>Link</a>"
+
+
+def test_truncate_keeps_tags_whole():
+    text = "Erster Satz ohne Ziffern hier, zweiter Satz mit <a href='x'>Link</a> am Ende"
+
+    assert truncate_text(text, 58) == "Erster Satz ohne Ziffern hier, zweiter Satz mit ..."
+    assert truncate_text(text, 66) == "Erster Satz ohne Ziffern hier, zweiter Satz mit <a href='x'>Li</a> ..."
+
+
+def test_iter_sentences_matches_legacy_split():
+    rng = random.Random(7)
+    alphabet = "abc дефг12 .!?\n\t"
+    for _ in range(500):
+        text = "".join(rng.choices(alphabet, k=rng.randint(0, 300)))
+        assert list(iter_sentences(text)) == LEGACY_PARAGRAPH.split(text)
+        assert "\n\n".join(iter_paragraphs(text)) == legacy_chunk_paragraphs(text)
+
+    assert list(iter_sentences(LOREM)) == LEGACY_PARAGRAPH.split(LOREM)
+
+
+def test_iter_paragraphs_streams_long_articles():
+    article = "Die Lage an der Front bleibt angespannt und unübersichtlich. " * 500
+
+    paragraphs = iter_paragraphs(article)
+
+    assert len(next(paragraphs)) < 440
+    assert chunk_paragraphs(article) == "\n\n".join(iter_paragraphs(article))
+
+
 if __name__ == "__main__":
     test_chunk_paragraphs()
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from bot.lru import LRUCache
+from bot.translation_cache import TranslationCache, make_key
+
+
+def test_make_key_normalizes_whitespace():
+    assert make_key("Київ  під\tобстрілом \n", "de", False) == make_key("Київ під обстрілом", "de", False)
+    assert make_key("Київ", "de", False) != make_key("Київ", "de", True)
+    assert make_key("Київ", "de", False) != make_key("Київ", "en", False)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_ttl():
+    cache = LRUCache(2, ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+async def test_single_flight():
+    cache = TranslationCache(maxsize=8, persist=False)
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "übersetzt"
+
+    results = await asyncio.gather(*(cache.get_or_translate("текст", "de", False, factory) for _ in range(5)))
+    assert results == ["übersetzt"] * 5
+    assert calls == 1
+
+    assert await cache.get_or_translate("текст", "de", False, factory) == "übersetzt"
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["memory_hits"] == 1
+    assert stats["saved_chars"] == 5 * len("текст")
+
+
+async def test_failure_is_not_cached():
+    cache = TranslationCache(maxsize=8, persist=False)
+
+    async def failing():
+        raise RuntimeError("backend down")
+
+    async def working():
+        return "ok"
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_translate("текст", "de", False, failing)
+
+    assert await cache.get_or_translate("текст", "de", False, working) == "ok"
+
+
+async def test_cancelled_caller_leaves_waiters_their_result():
+    cache = TranslationCache(maxsize=8, persist=False)
+
+    async def factory():
+        await asyncio.sleep(0.01)
+        return "übersetzt"
+
+    first = asyncio.create_task(cache.get_or_translate("текст", "de", False, factory))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(cache.get_or_translate("текст", "de", False, factory))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "übersetzt"
+    assert first.cancelled()
+    assert cache.stats()["misses"] == 1
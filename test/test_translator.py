@@ -0,0 +1,173 @@
+import asyncio
+import time
+
+import deep_translator.google
+
+from bot.config import TRANSLATION_BREAKER_FAILURES
+from bot.health import CircuitBreaker
+from bot.translator import DeepLBatcher, GoogleTranslator, QuotaExceededError, TranslatorScheduler
+
+
+class FakeBackend:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def translate(self, texts, target_lang):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise QuotaExceededError()
+        await asyncio.sleep(0)
+        return [f"{target_lang}:{t}" for t in texts]
+
+
+async def test_batcher_coalesces_concurrent_requests():
+    backend = FakeBackend()
+    batcher = DeepLBatcher(backend, FakeBackend(), window=0.01, max_items=50, max_chars=1000)
+
+    results = await asyncio.gather(*(batcher.translate(f"text {i}", "de") for i in range(10)))
+
+    assert results == [f"de:text {i}" for i in range(10)]
+    assert len(backend.calls) == 1
+
+
+async def test_batcher_respects_size_and_char_budget():
+    backend = FakeBackend()
+    batcher = DeepLBatcher(backend, FakeBackend(), window=0.01, max_items=3, max_chars=12)
+
+    await asyncio.gather(*(batcher.translate(t, "de") for t in ["aaaa", "bbbb", "cccc", "dddd", "eeeeeeeeeeee"]))
+
+    assert all(len(c) <= 3 and sum(map(len, c)) <= 12 for c in backend.calls)
+    assert sorted(t for c in backend.calls for t in c) == ["aaaa", "bbbb", "cccc", "dddd", "eeeeeeeeeeee"]
+
+
+async def test_batcher_falls_back_per_item():
+    fallback = FakeBackend()
+    batcher = DeepLBatcher(FakeBackend(fail=True), fallback, window=0.01)
+
+    results = await asyncio.gather(batcher.translate("a", "de"), batcher.translate("b", "de"))
+
+    assert results == ["de:a", "de:b"]
+    assert fallback.calls == [["a"], ["b"]]
+    assert batcher.stats()["failed"] == 1
+
+
+async def test_batcher_falls_back_when_results_dont_match():
+    class ShortBackend(FakeBackend):
+        async def translate(self, texts, target_lang):
+            return (await super().translate(texts, target_lang))[:-1]
+
+    batcher = DeepLBatcher(ShortBackend(), FakeBackend(), window=0.01)
+
+    results = await asyncio.wait_for(asyncio.gather(batcher.translate("a", "de"), batcher.translate("b", "de")), 1)
+
+    assert results == ["de:a", "de:b"]
+    assert batcher.stats()["failed"] == 1
+
+
+class SlowBackend(FakeBackend):
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    async def translate(self, texts, target_lang):
+        await asyncio.sleep(self.delay)
+        return await super().translate(texts, target_lang)
+
+
+class BrokenBackend(FakeBackend):
+    async def translate(self, texts, target_lang):
+        raise RuntimeError("backend down")
+
+
+def make_scheduler(deepl, google=None) -> TranslatorScheduler:
+    scheduler = TranslatorScheduler(deepl, google or FakeBackend(), hedge_min_delay=0.01)
+    scheduler.batcher.window = 0.001
+    return scheduler
+
+
+async def test_scheduler_routes_to_google_without_quota():
+    deepl = FakeBackend()
+    scheduler = make_scheduler(deepl)
+    scheduler.usage.sync(count=100, limit=105)
+
+    assert await scheduler.translate("short", "de") == "de:short"
+    assert await scheduler.translate("too long", "de") == "de:too long"
+
+    assert scheduler.routed == {"deepl": 1, "google": 1}
+    assert scheduler.usage.count == 105
+
+
+async def test_scheduler_stops_routing_to_deepl_on_quota_error():
+    scheduler = make_scheduler(FakeBackend(fail=True))
+
+    assert await scheduler.translate("text", "de") == "de:text"
+    assert await scheduler.translate("more", "de") == "de:more"
+
+    assert scheduler.routed == {"deepl": 1, "google": 1}
+    assert scheduler.deepl_health.breaker.state == CircuitBreaker.CLOSED
+    # Never synced, the limit stays unknown until the next sync renews the quota
+    assert scheduler.usage.state() == {"count": 0, "limit": None, "exhausted": True}
+    scheduler.usage.sync(count=0, limit=500_000)
+    assert scheduler.usage.has_quota(100)
+
+
+async def test_scheduler_opens_circuit_after_failures():
+    scheduler = make_scheduler(BrokenBackend())
+
+    for i in range(TRANSLATION_BREAKER_FAILURES):
+        assert await scheduler.translate(f"text {i}", "de") == f"de:text {i}"
+    assert scheduler.deepl_health.breaker.state == CircuitBreaker.OPEN
+
+    await scheduler.translate("after", "de")
+    assert scheduler.routed == {"deepl": TRANSLATION_BREAKER_FAILURES, "google": 1}
+
+
+async def test_quota_error_gives_back_half_open_trial():
+    deepl = FakeBackend(fail=True)
+    scheduler = make_scheduler(deepl)
+    breaker = scheduler.deepl_health.breaker
+    for _ in range(TRANSLATION_BREAKER_FAILURES):
+        breaker.record_failure()
+    breaker.opened_at -= breaker.reset_timeout
+
+    # The half-open trial runs into the quota
+    assert await scheduler.translate("text", "de") == "de:text"
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    deepl.fail = False
+    scheduler.usage.sync(count=0, limit=500_000)
+    await scheduler.translate("renewed", "de")
+    assert scheduler.routed == {"deepl": 2, "google": 0}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+async def test_scheduler_hedges_slow_primary():
+    scheduler = make_scheduler(SlowBackend(0.2))
+    for _ in range(20):
+        scheduler.primary_latency.add(0.01)
+
+    assert await scheduler.translate("text", "de") == "de:text"
+    assert scheduler.hedged == 1
+    assert scheduler.hedge_wins == 1
+
+
+async def test_google_calls_dont_share_state(monkeypatch):
+    class Response:
+        status_code = 200
+
+        def __init__(self, text):
+            self.text = f'<div class="result-container">T:{text}</div>'
+
+        def close(self):
+            pass
+
+    def get(url, params=None, **kwargs):
+        # Another thread may change a shared params dict meanwhile
+        time.sleep(0.01)
+        return Response(params["q"])
+
+    monkeypatch.setattr(deep_translator.google.requests, "get", get)
+    texts = [f"text number {i}" for i in range(8)]
+
+    assert await GoogleTranslator().translate(texts, "de") == [f"T:{t}" for t in texts]
@@ -0,0 +1,61 @@
+"""
+Train the learned router from the posts table.
+Streams posts through a server-side cursor, so the history never has to fit in memory.
+Every spread post is learned once, labelled with its destination. The text is the one route() classifies:
+the source text from its backup row, or the German post with ROUTE_ON_TRANSLATION.
+
+Full training:        python -m tools.train_router
+Only new posts:       python -m tools.train_router --incremental
+"""
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+
+from bot.classifier import HashingNaiveBayes, strip_footer
+from bot.config import CHANNEL_BACKUP, ROUTE_ON_TRANSLATION, ROUTER_MODEL_PATH
+from bot.db import DBPool
+
+# Backup rows are stored with the backup channel as destination, they are no training labels
+QUERY = """select b.message_text as source_text, p.message_text, p.destination, p.created_at from posts p
+           join posts b on b.backup_id = p.backup_id and b.destination = $2
+           where p.destination <> $2 and p.created_at > $1::timestamptz
+           order by p.created_at"""
+
+
+async def train(path: Path, incremental: bool, prefetch: int) -> HashingNaiveBayes:
+    model = HashingNaiveBayes.load(path) if incremental else HashingNaiveBayes()
+    since = model.trained_until or "-infinity"
+    learned = 0
+
+    async with DBPool.connection() as conn:
+        # Cursors only exist inside a transaction
+        async with conn.transaction():
+            async for record in conn.cursor(QUERY, since, CHANNEL_BACKUP, prefetch=prefetch):
+                text = strip_footer(record["message_text"] or "") if ROUTE_ON_TRANSLATION else record["source_text"]
+                if not text:
+                    continue
+                model.learn(text, record["destination"], record["created_at"].isoformat())
+                learned += 1
+                if learned % 10_000 == 0:
+                    logging.info(f"Learned {learned} posts")
+
+    logging.info(f"Learned {learned} posts, model holds {len(model)} posts for {len(model.docs)} destinations")
+    return model
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Train the learned router from the posts table.")
+    parser.add_argument("--incremental", action="store_true", help="continue the existing model with newer posts")
+    parser.add_argument("--output", type=Path, default=Path(ROUTER_MODEL_PATH), help="model file")
+    parser.add_argument("--prefetch", type=int, default=1000, help="rows fetched per round trip")
+    args = parser.parse_args()
+
+    model = asyncio.run(train(args.output, args.incremental, args.prefetch))
+    model.save(args.output)
+    logging.info(f"Model written to {args.output} ({args.output.stat().st_size // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()